@@ -8,11 +8,11 @@ Usage:
 """
 
 import argparse
+import glob
 import os
 import sys
-import glob
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
 from typing import Dict, List, Tuple, Optional
 
 # Add src to path
@@ -20,21 +20,37 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.config_parser import AnalysisConfig
 
+# Results are keyed by (code, model), e.g. ('fluka', 'JEFF')
+ResultKey = Tuple[str, str]
+
+
+def _fast_loadtxt(filepath: str) -> np.ndarray:
+    """
+    Load a whitespace-separated numeric table as a 2D float64 array.
+
+    Uses the C tokenizer of np.loadtxt with ndmin=2 so single-row and
+    single-column files come back with a consistent shape. Callers narrow
+    the columns they keep to float32, which is ample for plotting.
+    """
+    return np.loadtxt(filepath, comments='#', dtype=np.float64, ndmin=2)
+
 
 def read_edep_profile(filepath: str) -> Tuple[np.ndarray, np.ndarray]:
     """Read energy deposition profile from dat file."""
-    data = np.loadtxt(filepath, comments='#')
-    if data.ndim == 1:
-        return np.array([0.5]), np.array([data[0]])
-    return data[:, 0], data[:, 1]
+    data = _fast_loadtxt(filepath)
+    if data.shape[0] == 1 or data.shape[1] == 1:
+        return (np.array([0.5], dtype=np.float32),
+                np.array([data.flat[0]], dtype=np.float32))
+    return data[:, 0].astype(np.float32), data[:, 1].astype(np.float32)
 
 
 def read_neutron_spectrum(filepath: str) -> Tuple[np.ndarray, np.ndarray]:
     """Read neutron spectrum from dat file."""
-    data = np.loadtxt(filepath, comments='#')
-    if data.ndim == 1:
-        return np.array([1.0]), np.array([data[0]])
-    return data[:, 0], data[:, 1]
+    data = _fast_loadtxt(filepath)
+    if data.shape[0] == 1 or data.shape[1] == 1:
+        return (np.array([1.0], dtype=np.float32),
+                np.array([data.flat[0]], dtype=np.float32))
+    return data[:, 0].astype(np.float32), data[:, 1].astype(np.float32)
 
 
 def discover_results(results_dir: str) -> Dict[str, Dict[str, str]]:
@@ -46,28 +62,134 @@ def discover_results(results_dir: str) -> Dict[str, Dict[str, str]]:
     """
     results = {'fluka': {}, 'geant4': {}}
 
-    # FLUKA results
-    fluka_dirs = glob.glob(os.path.join(results_dir, 'fluka', '*'))
-    for d in fluka_dirs:
-        if os.path.isdir(d):
-            model = os.path.basename(d)
-            results['fluka'][model] = d
-
-    # Geant4 results
-    geant4_dirs = glob.glob(os.path.join(results_dir, 'geant4', '*'))
-    for d in geant4_dirs:
-        if os.path.isdir(d):
-            model = os.path.basename(d)
-            results['geant4'][model] = d
+    # scandir entries carry their file type, so no extra stat per entry
+    for code in results:
+        try:
+            with os.scandir(os.path.join(results_dir, code)) as it:
+                for entry in it:
+                    if not entry.name.startswith('.') and entry.is_dir():
+                        results[code][entry.name] = entry.path
+        except FileNotFoundError:
+            continue
 
     return results
 
 
+CACHE_SUFFIX = '.npycache.npy'
+
+
+def _cached_load(filepath: str, reader) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read a result file, reusing a .npy cache stored next to it.
+
+    The cache name records the source's st_mtime_ns and st_size, so a
+    cache is only used for exactly the file it was made from (an older
+    copy put in place, or a rewrite within the filesystem's mtime
+    resolution, gets a new key). Otherwise the file is re-parsed with
+    reader, the cache rewritten and caches of older versions removed.
+
+    Args:
+        filepath: Path to the .dat file
+        reader: Function mapping a filepath to an (x, y) tuple
+
+    Returns:
+        (x, y) tuple of arrays
+    """
+    cache = None
+    try:
+        st = os.stat(filepath)
+        cache = f"{filepath}.{st.st_mtime_ns}-{st.st_size}{CACHE_SUFFIX}"
+        stacked = np.load(cache, mmap_mode='r')
+        return stacked[0], stacked[1]
+    except (OSError, ValueError):
+        pass
+
+    x, y = reader(filepath)
+    if cache is None:
+        return x, y
+    try:
+        for stale in glob.glob(glob.escape(filepath) + '.*' + CACHE_SUFFIX):
+            os.remove(stale)
+        np.save(cache, np.stack([x, y]))
+    except OSError:
+        # Read-only results directory: just skip caching
+        pass
+    return x, y
+
+
+def _same_grid(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    Check whether two bin grids are the same.
+
+    Identity, shape and end points are checked first so the full
+    element-wise comparison only runs for plausible matches.
+    """
+    if a is b:
+        return True
+    if a.shape != b.shape:
+        return False
+    if len(a) and not (np.isclose(a[0], b[0]) and np.isclose(a[-1], b[-1])):
+        return False
+    return np.allclose(a, b)
+
+
+def _load_parallel(
+    files: List[Tuple[ResultKey, str]],
+    reader,
+) -> Dict[ResultKey, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read several result files concurrently.
+
+    Args:
+        files: List of (key, filepath) tuples
+        reader: Function mapping a filepath to an (x, y) tuple, used on
+            cache misses
+
+    Returns:
+        Dict mapping key to the reader's result, in sorted key order;
+        unreadable files are skipped
+    """
+    def _read(path):
+        try:
+            return _cached_load(path, reader)
+        except Exception as e:
+            print(f"Warning: Could not read {path}: {e}")
+            return None
+
+    data = {}
+    if not files:
+        return data
+
+    # Insert in key order so the plots can iterate without re-sorting
+    files = sorted(files)
+
+    # Threads rather than processes: numpy releases the GIL while parsing
+    # and the resulting arrays don't need to be pickled back.
+    with ThreadPoolExecutor(max_workers=min(32, len(files))) as ex:
+        results = ex.map(_read, [path for _, path in files])
+        grids = []
+        for (key, _), result in zip(files, results):
+            if result is None:
+                continue
+            # Datasets on the same binning share one grid object so that
+            # later grid comparisons reduce to an identity check
+            x, y = result
+            for grid in grids:
+                if _same_grid(x, grid):
+                    x = grid
+                    break
+            else:
+                grids.append(x)
+            data[key] = (x, y)
+
+    return data
+
+
 def load_all_edep(
     results: Dict[str, Dict[str, str]]
-) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+) -> Dict[ResultKey, Tuple[np.ndarray, np.ndarray]]:
     """Load energy deposition profiles for all results."""
-    data = {}
+    files = []
 
     for code in ['fluka', 'geant4']:
         for model, output_dir in results[code].items():
@@ -77,20 +199,16 @@ def load_all_edep(
                 # Try FLUKA format
                 edep_file = os.path.join(output_dir, 'input001_21.dat')
             if os.path.exists(edep_file):
-                try:
-                    z, edep = read_edep_profile(edep_file)
-                    data[f"{code}/{model}"] = (z, edep)
-                except Exception as e:
-                    print(f"Warning: Could not read {edep_file}: {e}")
+                files.append(((code, model), edep_file))
 
-    return data
+    return _load_parallel(files, read_edep_profile)
 
 
 def load_all_spectra(
     results: Dict[str, Dict[str, str]]
-) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+) -> Dict[ResultKey, Tuple[np.ndarray, np.ndarray]]:
     """Load neutron spectra for all results."""
-    data = {}
+    files = []
 
     for code in ['fluka', 'geant4']:
         for model, output_dir in results[code].items():
@@ -99,25 +217,65 @@ def load_all_spectra(
                 # Try FLUKA format
                 spec_file = os.path.join(output_dir, 'input001_23.dat')
             if os.path.exists(spec_file):
-                try:
-                    e, counts = read_neutron_spectrum(spec_file)
-                    data[f"{code}/{model}"] = (e, counts)
-                except Exception as e:
-                    print(f"Warning: Could not read {spec_file}: {e}")
+                files.append(((code, model), spec_file))
 
-    return data
+    return _load_parallel(files, read_neutron_spectrum)
+
+
+def _pyplot():
+    """
+    Import pyplot on first use.
+
+    Deferring the import keeps --help and data-only runs fast. The
+    non-interactive Agg backend is selected since every plot here is
+    written to file.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def interp_ratio(
+    ref_x: np.ndarray,
+    ref_y: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+) -> np.ndarray:
+    """
+    Ratio of y to ref_y on the reference grid.
+
+    y is interpolated onto ref_x only when the grids differ. The division
+    writes straight into the output buffer and bins where the reference is
+    zero are set to 1.
+
+    Args:
+        ref_x: Reference grid
+        ref_y: Reference values
+        x: Grid of the compared dataset (sorted)
+        y: Values of the compared dataset
+
+    Returns:
+        Ratio array on ref_x
+    """
+    if not _same_grid(x, ref_x):
+        y = np.interp(ref_x, x, y)
+    out = np.ones(len(ref_x), dtype=np.result_type(y, ref_y))
+    np.divide(y, ref_y, out=out, where=ref_y != 0)
+    return out
 
 
 def plot_edep_comparison(
-    edep_data: Dict[str, Tuple[np.ndarray, np.ndarray]],
-    reference: str,
-    output_path: str,
+    edep_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+    reference: ResultKey,
+    output_paths: List[str],
     log_scale: bool = True,
     show_ratio: bool = True,
     colors: Optional[Dict] = None,
     linestyles: Optional[Dict] = None,
 ):
     """Plot energy deposition comparison with optional ratio panel."""
+    plt = _pyplot()
     if not edep_data:
         print("No energy deposition data to plot")
         return
@@ -132,9 +290,8 @@ def plot_edep_comparison(
 
     ref_z, ref_edep = edep_data.get(reference, (None, None))
 
-    for label, (z, edep) in sorted(edep_data.items()):
-        code = label.split('/')[0]
-        model = label.split('/')[1]
+    for (code, model), (z, edep) in edep_data.items():
+        label = f"{code}/{model}"
 
         # Get style
         color = None
@@ -149,14 +306,8 @@ def plot_edep_comparison(
         ax1.plot(z, edep, label=label, color=color, linestyle=ls, linewidth=1.5)
 
         # Plot ratio if reference exists
-        if ax2 is not None and ref_edep is not None and label != reference:
-            # Interpolate to reference z-grid if needed
-            if len(z) == len(ref_z) and np.allclose(z, ref_z):
-                ratio = np.divide(edep, ref_edep, out=np.ones_like(edep),
-                                 where=ref_edep != 0)
-            else:
-                ratio = np.interp(ref_z, z, edep) / ref_edep
-                ratio = np.where(ref_edep != 0, ratio, 1.0)
+        if ax2 is not None and ref_edep is not None and (code, model) != reference:
+            ratio = interp_ratio(ref_z, ref_edep, z, edep)
             ax2.plot(ref_z, ratio, label=label, color=color, linestyle=ls,
                     linewidth=1.5)
 
@@ -169,7 +320,7 @@ def plot_edep_comparison(
 
     if ax2 is not None:
         ax2.set_xlabel('z [cm]')
-        ax2.set_ylabel(f'Ratio to {reference}')
+        ax2.set_ylabel(f"Ratio to {'/'.join(reference)}")
         ax2.axhline(y=1.0, color='gray', linestyle='-', linewidth=0.5)
         ax2.axhline(y=0.9, color='gray', linestyle='--', linewidth=0.5)
         ax2.axhline(y=1.1, color='gray', linestyle='--', linewidth=0.5)
@@ -179,21 +330,23 @@ def plot_edep_comparison(
         ax1.set_xlabel('z [cm]')
 
     plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"Saved: {output_path}")
+    for output_path in output_paths:
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
+        print(f"Saved: {output_path}")
+    plt.close(fig)
 
 
 def plot_spectrum_comparison(
-    spectrum_data: Dict[str, Tuple[np.ndarray, np.ndarray]],
-    reference: str,
-    output_path: str,
+    spectrum_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+    reference: ResultKey,
+    output_paths: List[str],
     log_scale: bool = True,
     show_ratio: bool = True,
     colors: Optional[Dict] = None,
     linestyles: Optional[Dict] = None,
 ):
     """Plot neutron spectrum comparison with optional ratio panel."""
+    plt = _pyplot()
     if not spectrum_data:
         print("No spectrum data to plot")
         return
@@ -208,9 +361,8 @@ def plot_spectrum_comparison(
 
     ref_e, ref_counts = spectrum_data.get(reference, (None, None))
 
-    for label, (e, counts) in sorted(spectrum_data.items()):
-        code = label.split('/')[0]
-        model = label.split('/')[1]
+    for (code, model), (e, counts) in spectrum_data.items():
+        label = f"{code}/{model}"
 
         color = None
         if colors and code in colors and model in colors[code]:
@@ -223,7 +375,7 @@ def plot_spectrum_comparison(
         ax1.step(e, counts, label=label, color=color, linestyle=ls,
                  linewidth=1.5, where='mid')
 
-        if ax2 is not None and ref_counts is not None and label != reference:
+        if ax2 is not None and ref_counts is not None and (code, model) != reference:
             ratio = np.divide(counts, ref_counts, out=np.ones_like(counts),
                              where=ref_counts != 0)
             ax2.step(ref_e, ratio, label=label, color=color, linestyle=ls,
@@ -239,7 +391,7 @@ def plot_spectrum_comparison(
 
     if ax2 is not None:
         ax2.set_xlabel('Energy [GeV]')
-        ax2.set_ylabel(f'Ratio to {reference}')
+        ax2.set_ylabel(f"Ratio to {'/'.join(reference)}")
         ax2.set_xscale('log')
         ax2.axhline(y=1.0, color='gray', linestyle='-', linewidth=0.5)
         ax2.axhline(y=0.9, color='gray', linestyle='--', linewidth=0.5)
@@ -250,31 +402,64 @@ def plot_spectrum_comparison(
         ax1.set_xlabel('Energy [GeV]')
 
     plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"Saved: {output_path}")
+    for output_path in output_paths:
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
+        print(f"Saved: {output_path}")
+    plt.close(fig)
+
+
+def _bin_widths(z: np.ndarray) -> np.ndarray:
+    """Bin widths for a grid of bin centres (unit width for a single bin)."""
+    if len(z) < 2:
+        return np.ones(len(z))
+    return np.gradient(z.astype(np.float64))
+
+
+def integrate_profiles(
+    edep_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+) -> np.ndarray:
+    """
+    Total energy deposited for every profile.
+
+    Profiles sharing a grid are stacked and integrated with a single
+    matrix-vector product against the bin widths. A histogram sum is used
+    rather than trapezoidal quadrature because the values are per-bin
+    averages; on uniform grids this equals sum(edep) * dz.
+
+    Args:
+        edep_data: Dict mapping (code, model) to (z, edep)
+
+    Returns:
+        Array of totals (float64) in the order of edep_data
+    """
+    items = list(edep_data.values())
+    totals = np.empty(len(items))
+
+    groups = {}
+    for i, (z, _) in enumerate(items):
+        groups.setdefault(id(z), (z, []))[1].append(i)
+
+    for z, indices in groups.values():
+        stack = np.array([items[i][1] for i in indices], dtype=np.float64)
+        totals[indices] = stack @ _bin_widths(z)
+
+    return totals
 
 
 def plot_total_edep_bar(
-    edep_data: Dict[str, Tuple[np.ndarray, np.ndarray]],
-    output_path: str,
+    edep_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+    output_paths: List[str],
 ):
     """Plot bar chart of total energy deposited by each model."""
+    plt = _pyplot()
     if not edep_data:
         print("No energy deposition data to plot")
         return
 
-    labels = []
-    totals = []
-    colors_list = []
-
-    for label, (z, edep) in sorted(edep_data.items()):
-        code = label.split('/')[0]
-        dz = z[1] - z[0] if len(z) > 1 else 1.0
-        total = np.sum(edep) * dz
-        labels.append(label)
-        totals.append(total)
-        colors_list.append('#1f77b4' if code == 'fluka' else '#ff7f0e')
+    labels = [f"{code}/{model}" for code, model in edep_data]
+    colors_list = ['#1f77b4' if code == 'fluka' else '#ff7f0e'
+                   for code, _ in edep_data]
+    totals = integrate_profiles(edep_data)
 
     fig, ax = plt.subplots(figsize=(12, 6))
     x = np.arange(len(labels))
@@ -294,23 +479,41 @@ def plot_total_edep_bar(
                    ha='center', va='bottom', fontsize=8, rotation=45)
 
     plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"Saved: {output_path}")
+    for output_path in output_paths:
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
+        print(f"Saved: {output_path}")
+    plt.close(fig)
+
+
+def _stack_on_grid(
+    edep_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+    z_grid: np.ndarray,
+) -> np.ndarray:
+    """
+    Interpolate every profile onto z_grid into one (n_models, n_z) array.
+
+    The array is preallocated as float32 and filled row by row, so the
+    reductions that follow run over a single contiguous block.
+    """
+    stack = np.empty((len(edep_data), len(z_grid)), dtype=np.float32)
+    for i, (z, edep) in enumerate(edep_data.values()):
+        stack[i] = np.interp(z_grid, z, edep)
+    return stack
 
 
 def plot_model_spread(
-    edep_data: Dict[str, Tuple[np.ndarray, np.ndarray]],
-    output_path: str,
+    edep_data: Dict[ResultKey, Tuple[np.ndarray, np.ndarray]],
+    output_paths: List[str],
 ):
     """Plot model spread (min/max envelope) for FLUKA and Geant4."""
+    plt = _pyplot()
     if not edep_data:
         print("No energy deposition data to plot")
         return
 
     # Separate by code
-    fluka_data = {k: v for k, v in edep_data.items() if k.startswith('fluka/')}
-    geant4_data = {k: v for k, v in edep_data.items() if k.startswith('geant4/')}
+    fluka_data = {k: v for k, v in edep_data.items() if k[0] == 'fluka'}
+    geant4_data = {k: v for k, v in edep_data.items() if k[0] == 'geant4'}
 
     fig, ax = plt.subplots(figsize=(10, 6))
 
@@ -326,10 +529,10 @@ def plot_model_spread(
 
     # FLUKA envelope
     if fluka_data:
-        all_edep = np.array([np.interp(z_grid, z, edep) for _, (z, edep) in fluka_data.items()])
-        fluka_mean = np.mean(all_edep, axis=0)
-        fluka_min = np.min(all_edep, axis=0)
-        fluka_max = np.max(all_edep, axis=0)
+        all_edep = _stack_on_grid(fluka_data, z_grid)
+        fluka_mean = all_edep.mean(axis=0)
+        fluka_min = all_edep.min(axis=0)
+        fluka_max = all_edep.max(axis=0)
 
         ax.fill_between(z_grid, fluka_min, fluka_max, alpha=0.3, color='blue',
                        label='FLUKA spread')
@@ -337,10 +540,10 @@ def plot_model_spread(
 
     # Geant4 envelope
     if geant4_data:
-        all_edep = np.array([np.interp(z_grid, z, edep) for _, (z, edep) in geant4_data.items()])
-        g4_mean = np.mean(all_edep, axis=0)
-        g4_min = np.min(all_edep, axis=0)
-        g4_max = np.max(all_edep, axis=0)
+        all_edep = _stack_on_grid(geant4_data, z_grid)
+        g4_mean = all_edep.mean(axis=0)
+        g4_min = all_edep.min(axis=0)
+        g4_max = all_edep.max(axis=0)
 
         ax.fill_between(z_grid, g4_min, g4_max, alpha=0.3, color='orange',
                        label='Geant4 spread')
@@ -355,9 +558,10 @@ def plot_model_spread(
     ax.grid(True, alpha=0.3)
 
     plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"Saved: {output_path}")
+    for output_path in output_paths:
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
+        print(f"Saved: {output_path}")
+    plt.close(fig)
 
 
 def main():
@@ -402,6 +606,7 @@ def main():
     results_dir = args.results or (config.results_dir if config else 'output/scan_results')
     output_dir = args.output or (config.output_dir if config else 'output/analysis')
     reference = args.reference or (f"{config.reference_code}/{config.reference_model}" if config else 'fluka/JEFF')
+    reference = tuple(reference.split('/', 1))
     formats = args.formats.split(',')
 
     os.makedirs(output_dir, exist_ok=True)
@@ -433,34 +638,37 @@ def main():
     # Generate plots
     print("\nGenerating plots...")
 
-    for fmt in formats:
-        # Energy deposition profile
-        plot_edep_comparison(
-            edep_data, reference,
-            os.path.join(output_dir, f'edep_profile_z.{fmt}'),
-            log_scale=True, show_ratio=True,
-            colors=colors, linestyles=linestyles,
-        )
-
-        # Neutron spectrum
-        plot_spectrum_comparison(
-            spectrum_data, reference,
-            os.path.join(output_dir, f'neutron_spectrum.{fmt}'),
-            log_scale=True, show_ratio=True,
-            colors=colors, linestyles=linestyles,
-        )
-
-        # Total energy bar chart
-        plot_total_edep_bar(
-            edep_data,
-            os.path.join(output_dir, f'total_edep_comparison.{fmt}'),
-        )
-
-        # Model spread
-        plot_model_spread(
-            edep_data,
-            os.path.join(output_dir, f'model_spread.{fmt}'),
-        )
+    # Each figure is drawn once and saved in every requested format
+    def output_paths(name):
+        return [os.path.join(output_dir, f'{name}.{fmt}') for fmt in formats]
+
+    # Energy deposition profile
+    plot_edep_comparison(
+        edep_data, reference,
+        output_paths('edep_profile_z'),
+        log_scale=True, show_ratio=True,
+        colors=colors, linestyles=linestyles,
+    )
+
+    # Neutron spectrum
+    plot_spectrum_comparison(
+        spectrum_data, reference,
+        output_paths('neutron_spectrum'),
+        log_scale=True, show_ratio=True,
+        colors=colors, linestyles=linestyles,
+    )
+
+    # Total energy bar chart
+    plot_total_edep_bar(
+        edep_data,
+        output_paths('total_edep_comparison'),
+    )
+
+    # Model spread
+    plot_model_spread(
+        edep_data,
+        output_paths('model_spread'),
+    )
 
     print(f"\nAnalysis complete. Results in: {output_dir}")
 
@@ -13,15 +13,42 @@ Energy is auto-detected from run_info.txt metadata.
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as colors
 import os
 import sys
 import re
+import mmap
+import functools
 import argparse
 import subprocess
 import csv
+import io
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Axis binning line in usbrea output, e.g.
+# "X coordinate: from -1.0000E+01 to  1.0000E+01 cm,    20 bins"
+AXIS_HEADER_RE = re.compile(rb'([XYZ]) coordinate: from\s+([-\d.E+]+)\s+to\s+([-\d.E+]+)\s+cm,\s+(\d+)\s+bins')
+
+# Line preceding the numeric data block
+DATA_MARKER_RE = re.compile(rb'accurate deposition|data follow', re.IGNORECASE)
+
+# First three numeric columns of a usxrea data line (energy, value, error)
+_NUM = rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[Ee][-+]?\d+)?'
+USRBDX_ROW_RE = re.compile(rb'^[ \t]*' + _NUM + rb'[ \t]+' + _NUM + rb'[ \t]+' + _NUM + rb'(?=\s|$)', re.M)
+
+# Contiguous run of numeric lines (blank lines allowed) in usbrea output
+DATA_BLOCK_RE = re.compile(rb'^[ \t]*[-+]?\.?\d[^\n]*(?:\n[ \t]*(?:[-+]?\.?\d[^\n]*)?)*', re.M)
+
+
+def _pyplot():
+    """
+    Import pyplot on first use.
+
+    Deferring the import keeps --help, simulation runs and compute-only
+    scans from paying for matplotlib start-up.
+    """
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def read_run_info(output_dir):
@@ -40,69 +67,109 @@ def read_run_info(output_dir):
     return info
 
 
-def read_usrbin_ascii(filename):
+def read_usrbin_ascii(filename, log=print):
     """
     Read FLUKA USRBIN ASCII output from usbrea.
 
     FLUKA stores data as A(ix,iy,iz) where Z varies fastest.
+    Values are returned as float32, the precision FLUKA scores in.
+
+    Parsed files are cached on (path, mtime, size), so re-plotting an
+    unchanged file skips the parse. The returned array is read-only and
+    the header is a fresh copy the caller may modify. Messages go through
+    log (print by default).
     """
-    with open(filename, 'r') as f:
-        content = f.read()
+    st = os.stat(filename)
+    data, header_info = _read_usrbin_cached(os.path.abspath(filename), st.st_mtime_ns, st.st_size)
 
-    # Parse header for grid dimensions
-    header_info = {}
+    log(f"Grid: X={header_info.get('nx')} bins [{header_info.get('xmin')}, {header_info.get('xmax')}]")
+    log(f"      Y={header_info.get('ny')} bins [{header_info.get('ymin')}, {header_info.get('ymax')}]")
+    log(f"      Z={header_info.get('nz')} bins [{header_info.get('zmin')}, {header_info.get('zmax')}]")
+    log(f"Read {len(data)} data values")
 
-    # X coordinate
-    match = re.search(r'X coordinate: from\s+([-\d.E+]+)\s+to\s+([-\d.E+]+)\s+cm,\s+(\d+)\s+bins', content)
-    if match:
-        header_info['xmin'] = float(match.group(1))
-        header_info['xmax'] = float(match.group(2))
-        header_info['nx'] = int(match.group(3))
+    return data, dict(header_info)
 
-    # Y coordinate
-    match = re.search(r'Y coordinate: from\s+([-\d.E+]+)\s+to\s+([-\d.E+]+)\s+cm,\s+(\d+)\s+bins', content)
-    if match:
-        header_info['ymin'] = float(match.group(1))
-        header_info['ymax'] = float(match.group(2))
-        header_info['ny'] = int(match.group(3))
 
-    # Z coordinate
-    match = re.search(r'Z coordinate: from\s+([-\d.E+]+)\s+to\s+([-\d.E+]+)\s+cm,\s+(\d+)\s+bins', content)
-    if match:
-        header_info['zmin'] = float(match.group(1))
-        header_info['zmax'] = float(match.group(2))
-        header_info['nz'] = int(match.group(3))
-
-    print(f"Grid: X={header_info.get('nx')} bins [{header_info.get('xmin')}, {header_info.get('xmax')}]")
-    print(f"      Y={header_info.get('ny')} bins [{header_info.get('ymin')}, {header_info.get('ymax')}]")
-    print(f"      Z={header_info.get('nz')} bins [{header_info.get('zmin')}, {header_info.get('zmax')}]")
-
-    # Find where data starts (after "accurate deposition" or similar line)
-    lines = content.split('\n')
-    data_start = 0
-    for i, line in enumerate(lines):
-        if 'accurate deposition' in line.lower() or 'data follow' in line.lower():
-            data_start = i + 1
-            break
-        # Also look for first line that starts with scientific notation
-        if i > 5 and re.match(r'\s+[-\d.E+]+', line):
-            data_start = i
-            break
+@functools.lru_cache(maxsize=8)
+def _read_usrbin_cached(filename, mtime_ns, size):
+    """Parse a USRBIN ASCII file; cache key includes mtime and size."""
+    data, header_info = _parse_usrbin_ascii(filename)
+    data.flags.writeable = False
+    return data, header_info
 
-    # Read all numeric data
-    data_values = []
-    for line in lines[data_start:]:
-        # Extract all scientific notation numbers
-        numbers = re.findall(r'[-+]?\d+\.?\d*[Ee][-+]?\d+', line)
-        for num in numbers:
-            try:
-                data_values.append(float(num))
-            except ValueError:
-                continue
 
-    print(f"Read {len(data_values)} data values")
+def _parse_usrbin_ascii(filename):
+    """Parse the header and data block of a usbrea ASCII file."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            content = b''
+        else:
+            # Map the file instead of reading it into a str: the regexes
+            # below run directly on the mapped bytes and only the numeric
+            # block is ever copied out.
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Find where data starts (after "accurate deposition" or "Data follow").
+    # Everything before the marker is header, so the axis search below
+    # never scans the numeric block.
+    data_start = None
+    header_end = len(content)
+    match = DATA_MARKER_RE.search(content)
+    if match:
+        header_end = match.start()
+        data_start = content.find(b'\n', match.end()) + 1
+
+    # Parse header for grid dimensions (one pass over all three axes)
+    header_info = {}
+    axes_end = 0
+    for match in AXIS_HEADER_RE.finditer(content, 0, header_end):
+        axis = match.group(1).decode().lower()
+        if f'n{axis}' in header_info:
+            break  # Start of a second detector: keep the first one
+        header_info[f'{axis}min'] = float(match.group(2))
+        header_info[f'{axis}max'] = float(match.group(3))
+        header_info[f'n{axis}'] = int(match.group(4))
+        axes_end = match.end()
+
+    # The data is the first numeric line after the marker or, without one,
+    # after the axis headers (or the start of the file if there are none)
+    block = DATA_BLOCK_RE.search(content, axes_end if data_start is None else data_start)
+    data_start = block.start() if block else len(content)
+
+    # Parse the numeric block in one C-level pass. The block runs from the
+    # first line starting with a number up to the next text line (e.g. the
+    # "Percentage errors follow" section), so np.fromstring never sees text.
+    # usbrea writes fixed-width lines, so when the header gives the bin
+    # count the scan is bounded to the lines that hold those bins.
+    expected = None
+    if all(f'n{axis}' in header_info for axis in 'xyz'):
+        expected = header_info['nx'] * header_info['ny'] * header_info['nz']
+
+    data_end = len(content)
+    if expected and data_start < len(content):
+        first_eol = content.find(b'\n', data_start)
+        per_line = len(content[data_start:first_eol].split()) if first_eol >= 0 else 0
+        if per_line:
+            n_lines = -(-expected // per_line)
+            bound = data_start + n_lines * (first_eol + 1 - data_start)
+            # Never cut a line (and so a number) in half
+            eol = content.find(b'\n', bound - 1)
+            data_end = len(content) if eol < 0 else min(eol + 1, data_end)
+
+    data = np.empty(0, dtype=np.float32)
+    for end in (data_end, len(content)):
+        match = DATA_BLOCK_RE.search(content, data_start, end)
+        if match:
+            data = np.fromstring(match.group(), sep=' ', dtype=np.float32)
+        # Lines were not uniform after all: fall back to the whole block
+        if expected is None or len(data) >= expected or end == len(content):
+            break
+    if expected is not None and len(data) > expected:
+        data = data[:expected]
+    if isinstance(content, mmap.mmap):
+        content.close()
 
-    return np.array(data_values), header_info
+    return data, header_info
 
 
 def read_usrbdx_ascii(filepath):
@@ -114,36 +181,32 @@ def read_usrbdx_ascii(filepath):
         fluence: Fluence dN/dE (particles/GeV/primary)
         errors: Relative errors
     """
-    energies = []
-    fluence = []
-    errors = []
-
-    with open(filepath, 'r') as f:
-        lines = f.readlines()
-
-    in_data = False
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#') or line.startswith('*'):
-            continue
-
-        # Look for data lines (3 columns: energy, value, error)
-        parts = line.split()
-        if len(parts) >= 3:
-            try:
-                e = float(parts[0])
-                v = float(parts[1])
-                err = float(parts[2]) if len(parts) > 2 else 0.0
-                energies.append(e)
-                fluence.append(v)
-                errors.append(err)
-            except ValueError:
-                continue
+    with open(filepath, 'rb') as f:
+        content = f.read()
+
+    # Data lines have 3 columns: energy, value, error. Pull the first three
+    # numbers of every such line in one regex pass and parse them together.
+    rows = USRBDX_ROW_RE.findall(content)
+    if not rows:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    table = np.fromstring(b'\n'.join(rows), sep=' ').reshape(-1, 3)
+    return table[:, 0], table[:, 1], table[:, 2]
 
-    return np.array(energies), np.array(fluence), np.array(errors)
+
+def zero_pad(data, size):
+    """
+    Extend data with trailing zeros to size elements.
+
+    Writes into one zero-filled buffer instead of going through np.pad's
+    generic N-D path; the dtype of data is kept.
+    """
+    out = np.zeros(size, dtype=data.dtype)
+    out[:len(data)] = data
+    return out
 
 
-def compute_total_energy(data, header, cycles=1):
+def compute_total_energy(data, header, cycles=1, nonzero=None):
     """
     Compute total energy deposition and statistical error on the mean.
 
@@ -155,6 +218,7 @@ def compute_total_energy(data, header, cycles=1):
         data: Energy deposition data array
         header: Header info with grid dimensions
         cycles: Number of FLUKA cycles (for error estimation)
+        nonzero: Positive bin values of data, if the caller already has them
 
     Returns:
         total: Total energy deposition (GeV/primary) - mean value
@@ -173,7 +237,7 @@ def compute_total_energy(data, header, cycles=1):
 
     expected_size = nx * ny * nz
     if len(data) < expected_size:
-        data = np.pad(data, (0, expected_size - len(data)))
+        data = zero_pad(data, expected_size)
     elif len(data) > expected_size:
         data = data[:expected_size]
 
@@ -185,18 +249,22 @@ def compute_total_energy(data, header, cycles=1):
 
     # Data is in GeV/cm³/primary, multiply by volume to get GeV/primary
     # This is already the mean value (averaged over all primaries by FLUKA)
-    total = np.sum(data) * bin_volume
+    # Accumulate in float64: the bin values themselves are float32
+    total = np.add.reduce(data, dtype=np.float64) * bin_volume
 
     # Estimate statistical error on the mean
     # For Monte Carlo, error scales as 1/sqrt(N) where N = cycles * primaries_per_cycle
     # Using relative standard deviation of non-zero bins as proxy for spread
-    nonzero_data = data[data > 0]
+    nonzero_data = data[data > 0] if nonzero is None else nonzero
     if len(nonzero_data) > 1 and total > 0:
-        # Relative standard deviation of bin values
-        rel_std = np.std(nonzero_data) / np.mean(nonzero_data)
+        # Relative standard deviation of bin values, from the sum and sum of
+        # squares (two float64-accumulated passes, no temporaries)
+        n_bins = len(nonzero_data)
+        mean = np.add.reduce(nonzero_data, dtype=np.float64) / n_bins
+        mean_sq = np.einsum('i,i->', nonzero_data, nonzero_data, dtype=np.float64) / n_bins
+        rel_std = np.sqrt(max(mean_sq - mean * mean, 0.0)) / mean
         # Error on sum scales with sqrt(N_bins), error on mean scales with 1/sqrt(cycles)
         # Combined estimate: rel_error ~ rel_std / sqrt(N_bins) / sqrt(cycles)
-        n_bins = len(nonzero_data)
         rel_error = rel_std / np.sqrt(n_bins) / np.sqrt(cycles)
         error = total * rel_error
     elif total > 0:
@@ -208,7 +276,26 @@ def compute_total_energy(data, header, cycles=1):
     return total, error
 
 
-def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_mev=1.0, neutron_lib='', show_plot=True, cycles=1):
+def positive_range(values):
+    """
+    Smallest and largest positive entries of an array.
+
+    Uses masked reductions so no boolean-indexed copy of the data is made.
+
+    Args:
+        values: Array of bin values
+
+    Returns:
+        (min, max) over the positive entries, or None if there are none
+    """
+    vmax = values.max(initial=-np.inf)
+    if vmax <= 0:
+        return None
+    vmin = values.min(initial=np.inf, where=values > 0)
+    return vmin, vmax
+
+
+def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_mev=1.0, neutron_lib='', show_plot=False, cycles=1, ax=None):
     """Create energy deposition plot.
 
     Args:
@@ -219,6 +306,8 @@ def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_
         neutron_lib: Neutron library name (for title)
         show_plot: Whether to display the plot interactively
         cycles: Number of FLUKA cycles (for error estimation)
+        ax: Existing axes to draw into; a new figure is created (and closed
+            after saving) when omitted
 
     Returns:
         total_energy: Total energy deposited (GeV/primary) - mean value
@@ -239,7 +328,7 @@ def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_
 
     if len(data) < expected_size:
         print("Warning: Not enough data, padding with zeros")
-        data = np.pad(data, (0, expected_size - len(data)))
+        data = zero_pad(data, expected_size)
     elif len(data) > expected_size:
         print("Warning: Extra data, truncating")
         data = data[:expected_size]
@@ -247,49 +336,56 @@ def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_
     # FLUKA stores as A(ix, iy, iz) in Fortran column-major order
     # This means ix varies FASTEST, then iy, then iz (slowest)
     # So: A(1,1,1), A(2,1,1), ..., A(nx,1,1), A(1,1,2), A(2,1,2), ...
-    # Use Fortran order in reshape to match this storage
+    # Reading that sequence in C order as (nz, ny, nx) is a free view,
+    # unlike a Fortran-order reshape which copies the whole array
 
-    data_3d = data.reshape((nx, ny, nz), order='F')
+    data_3d = data.reshape((nz, ny, nx))
 
     # For XZ projection with ny=1, just take the slice
-    data_2d = data_3d[:, 0, :]  # Shape: (nx, nz) = (100, 200)
+    # Shape (nz, nx): Z on the vertical axis, X on the horizontal
+    plot_data = data_3d[:, 0, :]
 
-    print(f"2D data shape: {data_2d.shape}")
-    print(f"Data range: {data_2d.min():.2e} to {data_2d.max():.2e}")
+    print(f"2D data shape: {plot_data.T.shape}")
+    print(f"Data range: {plot_data.min():.2e} to {plot_data.max():.2e}")
 
-    # Create coordinate arrays for bin edges
-    x = np.linspace(xmin, xmax, nx + 1)
-    z = np.linspace(zmin, zmax, nz + 1)
+    plt = _pyplot()
+    from matplotlib.colors import LogNorm
 
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    # data_2d has shape (nx, nz)
-    # For pcolormesh: X should be horizontal, Z should be vertical
-    # pcolormesh(X, Y, C) where C[j, i] is at (X[i], Y[j])
-    # So we need to transpose: C should be (nz, nx) for Z on vertical, X on horizontal
-    plot_data = data_2d.T  # Now shape (nz, nx)
+    own_figure = ax is None
+    if own_figure:
+        fig, ax = plt.subplots(figsize=(10, 8))
+    else:
+        fig = ax.figure
 
     # Fixed color axis limits
     vmin, vmax = 1e-12, 1e-6
 
-    # Set floor for log scale - zeros become minimum value
-    plot_data_floored = np.where(plot_data <= 0, vmin, plot_data)
+    # Set floor for log scale - zeros become minimum value. A single
+    # np.maximum pass writes the floored copy without a boolean mask;
+    # plot_data itself is a view of data, which is still needed for totals.
+    plot_data_floored = np.maximum(plot_data, vmin)
 
-    # Report actual data range for reference
-    nonzero_data = plot_data[plot_data > 0]
+    # Report actual data range for reference. The positive bins are
+    # gathered once here and reused for the error estimate below.
+    nonzero_data = data[data > 0]
     if len(nonzero_data) > 0:
         print(f"Data range: {nonzero_data.min():.2e} to {nonzero_data.max():.2e}")
     print(f"Plot range (fixed): {vmin:.2e} to {vmax:.2e}")
 
     # Use log scale
-    norm = colors.LogNorm(vmin=vmin, vmax=vmax)
+    norm = LogNorm(vmin=vmin, vmax=vmax)
 
-    im = ax.pcolormesh(x, z, plot_data_floored,
-                       cmap='jet',
-                       norm=norm,
-                       shading='flat')
+    # The USRBIN grid is uniform, so draw it as an image spanning the
+    # mesh extent rather than building a QuadMesh vertex per bin
+    im = ax.imshow(plot_data_floored,
+                   origin='lower',
+                   extent=(xmin, xmax, zmin, zmax),
+                   aspect='auto',
+                   cmap='jet',
+                   norm=norm,
+                   interpolation='nearest')
 
-    cbar = plt.colorbar(im, ax=ax, label='Energy Deposition (GeV/cm³/primary)')
+    cbar = fig.colorbar(im, ax=ax, label='Energy Deposition (GeV/cm³/primary)')
 
     ax.set_xlabel('X (cm)', fontsize=12)
     ax.set_ylabel('Z (cm)', fontsize=12)
@@ -310,18 +406,63 @@ def plot_energy_deposition(data, header, output_file='edep_xz_plot.png', energy_
     # Don't force equal aspect for thin slab - it distorts the view
     ax.set_aspect('auto')
 
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=150, bbox_inches='tight')
+    # bbox_inches='tight' already fits the saved image to its contents
+    # (including the beam arrow below the axes), so no tight_layout pass
+    fig.savefig(output_file, dpi=150, bbox_inches='tight')
     print(f"Plot saved to: {output_file}")
     if show_plot:
         plt.show()
-    plt.close()
+    if own_figure:
+        plt.close(fig)
 
     # Compute total energy deposition (mean value and error on mean)
-    total_energy, error = compute_total_energy(data, header, cycles=cycles)
+    total_energy, error = compute_total_energy(data, header, cycles=cycles, nonzero=nonzero_data)
     return total_energy, error
 
 
+def index_output_dirs(output_base='./output'):
+    """
+    List run output directories with their modification times.
+
+    Args:
+        output_base: Directory containing the per-run output directories
+
+    Returns:
+        List of (name, path, mtime) tuples, excluding the 'latest' symlink
+    """
+    entries = []
+    with os.scandir(output_base) as it:
+        for entry in it:
+            if entry.name != 'latest':
+                entries.append((entry.name, entry.path, entry.stat().st_mtime))
+    return entries
+
+
+def find_latest_output(entries, energy_mev, neutron_lib=None):
+    """
+    Pick the most recent output directory for an energy (and library).
+
+    Args:
+        entries: Result of index_output_dirs()
+        energy_mev: Neutron energy in MeV
+        neutron_lib: Optional neutron library name to match as well
+
+    Returns:
+        Path of the newest matching directory, or None
+    """
+    tag = f'{energy_mev}MeV'
+    latest_dir = None
+    latest_time = 0
+
+    for name, path, mtime in entries:
+        if tag in name and (neutron_lib is None or neutron_lib in name):
+            if mtime > latest_time:
+                latest_time = mtime
+                latest_dir = path
+
+    return latest_dir
+
+
 def run_simulation(energy_mev, cycles=5, neutron_lib='JEFF'):
     """Run FLUKA simulation for a given energy."""
     print(f"\n{'='*60}")
@@ -336,29 +477,62 @@ def run_simulation(energy_mev, cycles=5, neutron_lib='JEFF'):
         return None
 
     # Find the output directory (most recent with this energy)
-    output_base = './output'
-    latest_dir = None
-    latest_time = 0
+    return find_latest_output(index_output_dirs(), energy_mev)
 
-    for dirname in os.listdir(output_base):
-        if f'{energy_mev}MeV' in dirname and dirname != 'latest':
-            dir_path = os.path.join(output_base, dirname)
-            mtime = os.path.getmtime(dir_path)
-            if mtime > latest_time:
-                latest_time = mtime
-                latest_dir = dir_path
 
-    return latest_dir
+def run_simulations_parallel(energies, cycles=5, neutron_lib='JEFF', workers=1):
+    """
+    Run FLUKA simulations for several energies, optionally in parallel.
+
+    Each run_fluka.sh invocation uses its own container and output
+    directory, so runs are independent. Threads are enough here since
+    the work happens in the docker subprocess.
+
+    Args:
+        energies: List of neutron energies in MeV
+        cycles: Number of FLUKA cycles per energy
+        neutron_lib: Neutron library to use
+        workers: Maximum number of concurrent simulations
+
+    Returns:
+        Dict mapping energy to its output directory (None on failure)
+    """
+    if workers <= 1:
+        return {e: run_simulation(e, cycles=cycles, neutron_lib=neutron_lib) for e in energies}
+
+    output_dirs = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_simulation, e, cycles, neutron_lib): e
+            for e in energies
+        }
+        for future in as_completed(futures):
+            energy = futures[future]
+            try:
+                output_dirs[energy] = future.result()
+            except Exception as e:
+                print(f"WARNING: Simulation for {energy} MeV raised: {e}")
+                output_dirs[energy] = None
+
+    return output_dirs
 
 
-def process_single_output(output_dir, show_plot=True):
-    """Process a single output directory and return energy deposition data."""
+def process_single_output(output_dir, show_plot=False, ax=None, compute_only=False, log=print):
+    """Process a single output directory and return energy deposition data.
+
+    Args:
+        output_dir: Run output directory (symlinks are resolved)
+        show_plot: Whether to display the plot interactively
+        ax: Existing axes to draw the XZ map into (see plot_energy_deposition)
+        compute_only: Only compute the total, skip the XZ plot
+        log: Receives each progress message (default: print)
+    """
     # Resolve symlink to actual path
     if os.path.islink(output_dir):
         link_target = os.readlink(output_dir)
         output_dir = os.path.join(os.path.dirname(output_dir), link_target)
 
-    print(f"\nProcessing: {output_dir}")
+    log(f"\nProcessing: {output_dir}")
 
     # Read run metadata for energy, library, and cycles
     run_info = read_run_info(output_dir)
@@ -370,25 +544,29 @@ def process_single_output(output_dir, show_plot=True):
     xz_file = os.path.join(output_dir, 'edep_xz.dat')
 
     if not os.path.exists(xz_file):
-        print(f"ERROR: File not found: {xz_file}")
+        log(f"ERROR: File not found: {xz_file}")
         return None
 
-    data, header = read_usrbin_ascii(xz_file)
+    data, header = read_usrbin_ascii(xz_file, log=log)
 
     if len(data) == 0:
-        print("ERROR: No data read from file")
+        log("ERROR: No data read from file")
         return None
 
-    # Save plot in the output directory
-    plot_file = os.path.join(output_dir, 'edep_xz_plot.png')
-    total_energy, error = plot_energy_deposition(
-        data, header,
-        output_file=plot_file,
-        energy_mev=energy_mev,
-        neutron_lib=neutron_lib,
-        show_plot=show_plot,
-        cycles=cycles
-    )
+    if compute_only:
+        total_energy, error = compute_total_energy(data, header, cycles=cycles)
+    else:
+        # Save plot in the output directory
+        plot_file = os.path.join(output_dir, 'edep_xz_plot.png')
+        total_energy, error = plot_energy_deposition(
+            data, header,
+            output_file=plot_file,
+            energy_mev=energy_mev,
+            neutron_lib=neutron_lib,
+            show_plot=show_plot,
+            cycles=cycles,
+            ax=ax
+        )
 
     return {
         'energy_mev': energy_mev,
@@ -399,12 +577,49 @@ def process_single_output(output_dir, show_plot=True):
     }
 
 
-def plot_energy_scan_summary(results, output_file='energy_scan_summary.png', neutron_lib=''):
-    """Create summary plot of total energy deposition vs neutron energy."""
-    energies = [r['energy_mev'] for r in results]
-    totals = [r['total_edep'] for r in results]
-    errors = [r['error'] for r in results]
+# Per-energy scan summary, one record per processed output
+SCAN_RESULT_DTYPE = np.dtype([
+    ('energy_mev', 'f8'),
+    ('total_edep', 'f8'),
+    ('error', 'f8'),
+])
+
+
+def scan_results_array(results):
+    """
+    Pack per-energy result dicts into a structured array sorted by energy.
+
+    The summary plot and CSV writer both read columns from this array
+    instead of re-extracting them from the dicts.
+
+    Args:
+        results: List of dicts from process_single_output()
+
+    Returns:
+        Structured array with SCAN_RESULT_DTYPE fields
+    """
+    scan = np.array(
+        [(r['energy_mev'], r['total_edep'], r['error']) for r in results],
+        dtype=SCAN_RESULT_DTYPE,
+    )
+    scan.sort(order='energy_mev')
+    return scan
+
+
+def plot_energy_scan_summary(results, output_file='energy_scan_summary.png', neutron_lib='', show_plot=False):
+    """Create summary plot of total energy deposition vs neutron energy.
+
+    Args:
+        results: Structured array from scan_results_array()
+        output_file: Path to save the plot
+        neutron_lib: Neutron library name (for title and legend)
+        show_plot: Whether to display the plot interactively
+    """
+    energies = results['energy_mev']
+    totals = results['total_edep']
+    errors = results['error']
 
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=(10, 7))
 
     ax.errorbar(energies, totals, yerr=errors, fmt='o-', capsize=5,
@@ -423,33 +638,38 @@ def plot_energy_scan_summary(results, output_file='energy_scan_summary.png', neu
     plt.tight_layout()
     plt.savefig(output_file, dpi=150, bbox_inches='tight')
     print(f"\nSummary plot saved to: {output_file}")
-    plt.show()
-    plt.close()
+    if show_plot:
+        plt.show()
+    plt.close(fig)
 
 
 def write_csv_results(results, output_file='energy_scan_results.csv', neutron_lib=''):
-    """Write energy scan results to CSV file."""
+    """Write energy scan results (structured array) to CSV file."""
+    # Relative errors for all energies at once (0 where the total is 0)
+    rel_errors = np.divide(results['error'], results['total_edep'],
+                           out=np.zeros(len(results)), where=results['total_edep'] > 0)
+
+    # Format everything in memory and write the file in one call
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(['# Energy scan results'])
+    writer.writerow([f'# Neutron library: {neutron_lib}'])
+    writer.writerow([f'# Generated: {datetime.now().isoformat()}'])
+    writer.writerow([])
+    writer.writerow(['energy_mev', 'total_edep_gev', 'stat_error_gev', 'relative_error'])
+    writer.writerows(
+        [float(r['energy_mev']), f"{r['total_edep']:.6e}", f"{r['error']:.6e}", f"{rel:.4f}"]
+        for r, rel in zip(results, rel_errors)
+    )
+
     with open(output_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['# Energy scan results'])
-        writer.writerow([f'# Neutron library: {neutron_lib}'])
-        writer.writerow([f'# Generated: {datetime.now().isoformat()}'])
-        writer.writerow([])
-        writer.writerow(['energy_mev', 'total_edep_gev', 'stat_error_gev', 'relative_error'])
-
-        for r in results:
-            rel_error = r['error'] / r['total_edep'] if r['total_edep'] > 0 else 0
-            writer.writerow([
-                r['energy_mev'],
-                f"{r['total_edep']:.6e}",
-                f"{r['error']:.6e}",
-                f"{rel_error:.4f}"
-            ])
+        f.write(buf.getvalue())
 
     print(f"CSV results saved to: {output_file}")
 
 
-def energy_scan_mode(energies, cycles=5, neutron_lib='JEFF', run_simulations=True):
+def energy_scan_mode(energies, cycles=5, neutron_lib='JEFF', run_simulations=True, show_plot=False, workers=1,
+                     plot_each=True):
     """
     Run energy scan: simulate multiple energies and create summary plots.
 
@@ -458,6 +678,13 @@ def energy_scan_mode(energies, cycles=5, neutron_lib='JEFF', run_simulations=Tru
         cycles: Number of FLUKA cycles per energy
         neutron_lib: Neutron library to use (JEFF, ENDF, TENDL)
         run_simulations: If True, run FLUKA simulations; if False, use existing outputs
+        show_plot: Whether to display the summary plot interactively
+        workers: Number of simulations to run concurrently; with plot_each=False,
+            also the number of outputs processed concurrently
+        plot_each: If False, only compute totals and skip the per-energy XZ plots
+
+    Returns:
+        Structured array of per-energy results (see scan_results_array)
     """
     print("="*60)
     print("FLUKA Energy Scan Mode")
@@ -466,44 +693,76 @@ def energy_scan_mode(energies, cycles=5, neutron_lib='JEFF', run_simulations=Tru
     print(f"Neutron library: {neutron_lib}")
     print(f"Cycles per energy: {cycles}")
     print(f"Run simulations: {run_simulations}")
+    if run_simulations or not plot_each:
+        print(f"Parallel workers: {workers}")
 
     results = []
 
+    # Run all simulations up front; plotting below stays on the main thread
+    if run_simulations:
+        sim_dirs = run_simulations_parallel(energies, cycles, neutron_lib, workers)
+    else:
+        # One directory listing shared by all energies
+        existing_dirs = index_output_dirs()
+
+    # Resolve the output directory of every energy first
+    outputs = []
     for energy in energies:
         if run_simulations:
-            output_dir = run_simulation(energy, cycles=cycles, neutron_lib=neutron_lib)
+            output_dir = sim_dirs.get(energy)
             if output_dir is None:
                 print(f"Skipping {energy} MeV due to simulation failure")
                 continue
         else:
             # Find existing output for this energy
-            output_base = './output'
-            output_dir = None
-            latest_time = 0
-
-            for dirname in os.listdir(output_base):
-                if f'{energy}MeV' in dirname and neutron_lib in dirname and dirname != 'latest':
-                    dir_path = os.path.join(output_base, dirname)
-                    mtime = os.path.getmtime(dir_path)
-                    if mtime > latest_time:
-                        latest_time = mtime
-                        output_dir = dir_path
+            output_dir = find_latest_output(existing_dirs, energy, neutron_lib)
 
             if output_dir is None:
                 print(f"No existing output found for {energy} MeV, skipping")
                 continue
-
-        result = process_single_output(output_dir, show_plot=False)
+        outputs.append((energy, output_dir))
+
+    fig = None
+    if plot_each:
+        # One figure is reused for every per-energy map: it is cleared between
+        # energies rather than torn down and rebuilt. pyplot is not
+        # thread-safe, so plotting stays serial on the main thread.
+        fig = _pyplot().figure(figsize=(10, 8))
+        processed = []
+        for energy, output_dir in outputs:
+            fig.clf()
+            processed.append(process_single_output(output_dir, show_plot=False, ax=fig.add_subplot()))
+    else:
+        # Compute-only: reading and summing release the GIL, so the
+        # outputs are processed concurrently. Workers collect their
+        # messages instead of printing them; they are printed here per
+        # output, in energy order, rather than interleaved line by line.
+        def process(output):
+            messages = []
+            result = process_single_output(output[1], compute_only=True, log=messages.append)
+            return result, messages
+
+        processed = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for result, messages in pool.map(process, outputs):
+                for message in messages:
+                    print(message)
+                processed.append(result)
+
+    for (energy, _), result in zip(outputs, processed):
         if result:
             results.append(result)
             print(f"  {energy} MeV: Total E_dep = {result['total_edep']:.4e} ± {result['error']:.4e} GeV/primary")
 
+    if fig is not None:
+        _pyplot().close(fig)
+
     if not results:
         print("ERROR: No results to plot")
         return
 
-    # Sort results by energy
-    results.sort(key=lambda x: x['energy_mev'])
+    # Collect into one energy-sorted array for the CSV and summary plot
+    scan = scan_results_array(results)
 
     # Create timestamp for output files
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -512,15 +771,15 @@ def energy_scan_mode(energies, cycles=5, neutron_lib='JEFF', run_simulations=Tru
 
     # Write CSV results
     csv_file = os.path.join(scan_dir, f'energy_scan_{neutron_lib}.csv')
-    write_csv_results(results, csv_file, neutron_lib)
+    write_csv_results(scan, csv_file, neutron_lib)
 
     # Create summary plot
     summary_file = os.path.join(scan_dir, f'energy_scan_summary_{neutron_lib}.png')
-    plot_energy_scan_summary(results, summary_file, neutron_lib)
+    plot_energy_scan_summary(scan, summary_file, neutron_lib, show_plot=show_plot)
 
     print(f"\nEnergy scan complete. Results in: {scan_dir}")
 
-    return results
+    return scan
 
 
 def run_flugg_mode(args):
@@ -595,10 +854,10 @@ def run_flugg_mode(args):
         print(f"\nProcessing output from: {latest_dir}")
         # Process and plot the results
         # For FLUGG mode, we have larger scale geometry
-        process_flugg_output(latest_dir)
+        process_flugg_output(latest_dir, show_plot=args.show)
 
 
-def process_flugg_output(output_dir):
+def process_flugg_output(output_dir, show_plot=False):
     """Process and plot FLUGG simulation output."""
     print(f"\nProcessing FLUGG output: {output_dir}")
 
@@ -626,28 +885,29 @@ def process_flugg_output(output_dir):
             plot_file = os.path.join(output_dir, 'edep_flugg_xz.png')
 
             # Create plot with FLUGG-appropriate settings
+            plt = _pyplot()
+            from matplotlib.colors import LogNorm
             fig, ax = plt.subplots(figsize=(12, 8))
 
             expected_size = header['nx'] * header['ny'] * header['nz']
             if len(data) < expected_size:
-                data = np.pad(data, (0, expected_size - len(data)))
-
-            data_3d = data.reshape((header['nx'], header['ny'], header['nz']), order='F')
-            data_2d = data_3d[:, 0, :]
-            plot_data = data_2d.T
+                data = zero_pad(data, expected_size)
 
-            x_edges = np.linspace(header['xmin'], header['xmax'], header['nx'] + 1)
-            z_edges = np.linspace(header['zmin'], header['zmax'], header['nz'] + 1)
+            # ix fastest, iz slowest: a C-order (nz, ny, nx) view, no copy
+            data_3d = data.reshape((header['nz'], header['ny'], header['nx']))
+            plot_data = data_3d[:, 0, :]
 
-            nonzero = plot_data[plot_data > 0]
-            if len(nonzero) > 0:
-                vmin = max(nonzero.min(), 1e-15)
-                vmax = nonzero.max()
+            data_range = positive_range(plot_data)
+            if data_range is not None:
+                vmin = max(float(data_range[0]), 1e-15)
+                vmax = float(data_range[1])
             else:
                 vmin, vmax = 1e-15, 1e-6
 
-            norm = colors.LogNorm(vmin=vmin, vmax=vmax)
-            im = ax.pcolormesh(x_edges, z_edges, plot_data, cmap='jet', norm=norm, shading='flat')
+            norm = LogNorm(vmin=vmin, vmax=vmax)
+            im = ax.imshow(plot_data, origin='lower',
+                           extent=(header['xmin'], header['xmax'], header['zmin'], header['zmax']),
+                           aspect='auto', cmap='jet', norm=norm, interpolation='nearest')
             plt.colorbar(im, ax=ax, label='Energy Deposition (GeV/cm³/primary)')
 
             ax.set_xlabel('X (cm)', fontsize=12)
@@ -658,8 +918,9 @@ def process_flugg_output(output_dir):
             plt.tight_layout()
             plt.savefig(plot_file, dpi=150, bbox_inches='tight')
             print(f"Plot saved to: {plot_file}")
-            plt.show()
-            plt.close()
+            if show_plot:
+                plt.show()
+            plt.close(fig)
     else:
         print(f"No output file found at: {xz_file}")
         print("Check that the FLUGG simulation completed successfully")
@@ -674,9 +935,12 @@ Examples:
   # Simple slab mode (neutrons)
   python3 plot_edep.py                           # Plot latest output
   python3 plot_edep.py -o output/20240101_120000 # Plot specific output
+  python3 plot_edep.py --show                    # Also open an interactive window
   python3 plot_edep.py --scan                    # Run energy scan (default energies)
   python3 plot_edep.py --scan --energies 0.1,1,10  # Custom energies
   python3 plot_edep.py --scan --no-run           # Plot existing outputs only
+  python3 plot_edep.py --scan --workers 3        # Run 3 scan energies at a time
+  python3 plot_edep.py --scan --no-run --no-plots  # Summary only, no per-energy maps
 
   # Full detector mode (FLUGG with GDML/DD4hep geometry)
   python3 plot_edep.py --flugg --gdml detector.gdml --energy 1500
@@ -717,6 +981,12 @@ Examples:
                         help='Neutron library: JEFF, ENDF, JENDL, CENDL, BROND (default: JEFF)')
     parser.add_argument('--no-run', action='store_true',
                         help='Do not run simulations, use existing outputs only')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='Scan mode: skip per-energy XZ plots, only compute totals')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of scan simulations (and, with --no-plots, outputs) to process in parallel (default: 1)')
+    parser.add_argument('--show', action='store_true',
+                        help='Display plots interactively (default: only save to file)')
 
     args = parser.parse_args()
 
@@ -730,7 +1000,10 @@ Examples:
             energies,
             cycles=args.cycles,
             neutron_lib=args.library,
-            run_simulations=not args.no_run
+            run_simulations=not args.no_run,
+            show_plot=args.show,
+            workers=args.workers,
+            plot_each=not args.no_plots
         )
     else:
         # Single plot mode
@@ -770,6 +1043,7 @@ Examples:
                     output_file=plot_file,
                     energy_mev=energy_mev,
                     neutron_lib=neutron_lib,
+                    show_plot=args.show,
                     cycles=cycles
                 )
                 print(f"\nTotal energy deposition (mean): {total:.4e} ± {error:.4e} GeV/primary")
@@ -6,6 +6,7 @@ Usage:
     python run_comparison.py --config config/simulation_config.yaml
     python run_comparison.py --config config/simulation_config.yaml --fluka-only
     python run_comparison.py --config config/simulation_config.yaml --parallel
+    python run_comparison.py --config config/simulation_config.yaml --parallel --persistent
 """
 
 import argparse
@@ -57,7 +58,32 @@ def main():
         '--workers',
         type=int,
         default=4,
-        help='Number of parallel workers (default: 4)'
+        help='Maximum parallel workers (default: 4, capped by CPU cores and ~2 GB memory per run)'
+    )
+    parser.add_argument(
+        '--verbose', '-v',
+        action='store_true',
+        help='Show simulation output live (sequential runs; always saved to run.log)'
+    )
+    parser.add_argument(
+        '--persistent',
+        action='store_true',
+        help='Reuse long-lived containers, one per image and worker (docker exec per run)'
+    )
+    parser.add_argument(
+        '--pin',
+        action='store_true',
+        help='Give each parallel worker its own CPU cores and memory share'
+    )
+    parser.add_argument(
+        '--allow-network',
+        action='store_true',
+        help='Give every container network access (default: --network=none where unused)'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Repeat runs whose inputs are unchanged since they last succeeded'
     )
     parser.add_argument(
         '--dry-run',
@@ -117,7 +143,9 @@ def main():
         return
 
     # Create runner and execute
-    runner = ComparisonRunner(config, use_flugg=args.flugg)
+    runner = ComparisonRunner(config, use_flugg=args.flugg, persistent=args.persistent,
+                              isolate_network=not args.allow_network,
+                              pin_resources=args.pin, echo_output=args.verbose)
 
     print("Starting simulations...")
     results = runner.run_all(
@@ -125,6 +153,7 @@ def main():
         geant4_models=geant4_models if geant4_models else None,
         parallel=args.parallel,
         max_workers=args.workers,
+        force=args.force,
     )
 
     # Write summary
@@ -6,10 +6,45 @@ Handles parsing and validation of simulation and analysis YAML configs.
 
 import yaml
 import os
-from dataclasses import dataclass, field
+import copy
+import functools
+import sys
+from types import MappingProxyType
+from dataclasses import dataclass, field, fields
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
+# libyaml's C parser when PyYAML was built with it, else the pure-Python one
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _file_key(path: str) -> Tuple[str, int, int]:
+    """Cache key for a file: absolute path, mtime and size."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+@functools.lru_cache(maxsize=32)
+def _load_yaml_cached(path: str, mtime_ns: int, size: int) -> Dict:
+    """Parse a YAML file; mtime_ns and size only key the cache."""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=YAML_LOADER)
+
+
+def _load_yaml(path: str) -> Dict:
+    """Parse a YAML file, reusing the cached parse of an unchanged file."""
+    return copy.deepcopy(_load_yaml_cached(*_file_key(path)))
+
+
+# Units per GeV for each supported energy unit; energies are divided by
+# these exact powers of ten rather than multiplied by inexact reciprocals
+ENERGY_PER_GEV = {
+    'GEV': 1.0,
+    'MEV': 1e3,
+    'KEV': 1e6,
+    'EV': 1e9,
+}
+
 
 @dataclass
 class ParticleConfig:
@@ -20,19 +55,27 @@ class ParticleConfig:
     position: Tuple[float, float, float]
     direction: Tuple[float, float, float]
 
+    # Resolved once in __post_init__
+    type_key: str = field(init=False, repr=False, compare=False)
+    fluka_name: str = field(init=False, repr=False, compare=False)
+    geant4_name: str = field(init=False, repr=False, compare=False)
+    _divisor: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        try:
+            self._divisor = ENERGY_PER_GEV[self.energy_unit.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown energy unit: {self.energy_unit}") from None
+
+        # Lowercased, interned particle type: the key of the particle tables
+        self.type_key = sys.intern(self.type.lower())
+        self.fluka_name = FLUKA_PARTICLES.get(self.type_key, self.type.upper())
+        self.geant4_name = GEANT4_PARTICLES.get(self.type_key, self.type_key)
+
     @property
     def energy_gev(self) -> float:
         """Return energy in GeV."""
-        if self.energy_unit.upper() == 'GEV':
-            return self.energy
-        elif self.energy_unit.upper() == 'MEV':
-            return self.energy / 1000.0
-        elif self.energy_unit.upper() == 'KEV':
-            return self.energy / 1e6
-        elif self.energy_unit.upper() == 'EV':
-            return self.energy / 1e9
-        else:
-            raise ValueError(f"Unknown energy unit: {self.energy_unit}")
+        return self.energy / self._divisor
 
     @property
     def energy_mev(self) -> float:
@@ -40,12 +83,67 @@ class ParticleConfig:
         return self.energy_gev * 1000.0
 
 
+def _as_range(values) -> Tuple[float, float]:
+    """
+    Coerce a [low, high] pair to a tuple of numbers.
+
+    YAML 1.1 reads exponents without a dot (1e-11) as strings, so those
+    are converted; ints and floats are kept as written.
+    """
+    low, high = values
+    return tuple(v if isinstance(v, (int, float)) else float(v) for v in (low, high))
+
+
+def _from_mapping(cls, data: Optional[Dict]):
+    """Build a scoring dataclass from a YAML mapping, ignoring unknown keys."""
+    names = {f.name for f in fields(cls) if f.init}
+    return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+
+@dataclass
+class EdepScoring:
+    """Energy deposition binning (ranges in cm)."""
+    enabled: bool = True
+    x_bins: int = 1
+    y_bins: int = 1
+    z_bins: int = 100
+    x_range: Tuple[float, float] = (-100, 100)
+    y_range: Tuple[float, float] = (-100, 100)
+    z_range: Tuple[float, float] = (0, 2)
+
+    def __post_init__(self):
+        self.x_range = _as_range(self.x_range)
+        self.y_range = _as_range(self.y_range)
+        self.z_range = _as_range(self.z_range)
+
+
+@dataclass
+class SpectrumScoring:
+    """Neutron exit spectrum binning (energies in GeV)."""
+    enabled: bool = True
+    energy_bins: int = 100
+    energy_range: Tuple[float, float] = (1e-11, 1e1)
+
+    def __post_init__(self):
+        self.energy_range = _as_range(self.energy_range)
+
+
+@dataclass
+class SecondariesScoring:
+    """Secondary particle tracking."""
+    enabled: bool = True
+    particles: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        self.particles = tuple(self.particles)
+
+
 @dataclass
 class ScoringConfig:
     """Scoring configuration."""
-    energy_deposition: Dict
-    neutron_spectrum: Dict
-    secondaries: Dict
+    energy_deposition: EdepScoring
+    neutron_spectrum: SpectrumScoring
+    secondaries: SecondariesScoring
 
 
 @dataclass
@@ -55,6 +153,9 @@ class FlukaConfig:
     cycles: int
     neutron_libraries: List[str]
     low_energy_neutron: bool
+    cpus: int = 1               # cycles run concurrently inside one container
+    timeout: int = 3600         # seconds before a run is stopped
+    scratch_size: str = '2g'    # tmpfs for the work directory; '' = container layer
 
 
 @dataclass
@@ -79,9 +180,17 @@ class SimulationConfig:
 
     @classmethod
     def from_yaml(cls, yaml_path: str) -> 'SimulationConfig':
-        """Load configuration from YAML file."""
-        with open(yaml_path, 'r') as f:
-            data = yaml.safe_load(f)
+        """
+        Load configuration from YAML file.
+
+        The parsed YAML is cached by path, mtime and size; every call
+        builds its own instance, so callers may modify it freely.
+        """
+        return cls.from_dict(_load_yaml(yaml_path))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SimulationConfig':
+        """Build configuration from a parsed YAML mapping."""
 
         particle = ParticleConfig(
             type=data['particle']['type'],
@@ -96,6 +205,9 @@ class SimulationConfig:
             cycles=data['fluka']['cycles'],
             neutron_libraries=data['fluka']['neutron_libraries'],
             low_energy_neutron=data['fluka'].get('low_energy_neutron', True),
+            cpus=int(data['fluka'].get('cpus', 1)),
+            timeout=int(data['fluka'].get('timeout', 3600)),
+            scratch_size=str(data['fluka'].get('scratch_size', '2g') or ''),
         )
 
         geant4 = Geant4Config(
@@ -105,9 +217,9 @@ class SimulationConfig:
         )
 
         scoring = ScoringConfig(
-            energy_deposition=data['scoring']['energy_deposition'],
-            neutron_spectrum=data['scoring']['neutron_spectrum'],
-            secondaries=data['scoring']['secondaries'],
+            energy_deposition=_from_mapping(EdepScoring, data['scoring']['energy_deposition']),
+            neutron_spectrum=_from_mapping(SpectrumScoring, data['scoring']['neutron_spectrum']),
+            secondaries=_from_mapping(SecondariesScoring, data['scoring']['secondaries']),
         )
 
         return cls(
@@ -169,9 +281,17 @@ class AnalysisConfig:
 
     @classmethod
     def from_yaml(cls, yaml_path: str) -> 'AnalysisConfig':
-        """Load configuration from YAML file."""
-        with open(yaml_path, 'r') as f:
-            data = yaml.safe_load(f)
+        """
+        Load configuration from YAML file.
+
+        The parsed YAML is cached by path, mtime and size; every call
+        builds its own instance, so callers may modify it freely.
+        """
+        return cls.from_dict(_load_yaml(yaml_path))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'AnalysisConfig':
+        """Build configuration from a parsed YAML mapping."""
 
         plots = {}
         for name, cfg in data.get('plots', {}).items():
@@ -205,8 +325,8 @@ class AnalysisConfig:
         return models
 
 
-# FLUKA particle type mapping
-FLUKA_PARTICLES = {
+# FLUKA particle type mapping (read-only)
+FLUKA_PARTICLES = MappingProxyType({
     'neutron': 'NEUTRON',
     'proton': 'PROTON',
     'electron': 'ELECTRON',
@@ -217,10 +337,10 @@ FLUKA_PARTICLES = {
     'muon-': 'MUON-',
     'pion+': 'PION+',
     'pion-': 'PION-',
-}
+})
 
-# Geant4 particle type mapping
-GEANT4_PARTICLES = {
+# Geant4 particle type mapping (read-only)
+GEANT4_PARTICLES = MappingProxyType({
     'neutron': 'neutron',
     'proton': 'proton',
     'electron': 'e-',
@@ -231,37 +351,45 @@ GEANT4_PARTICLES = {
     'muon-': 'mu-',
     'pion+': 'pi+',
     'pion-': 'pi-',
-}
+})
 
-# FLUKA neutron library SDUM codes (must be ≤8 chars)
-FLUKA_NEUTRON_LIBS = {
+# FLUKA neutron library SDUM codes (must be ≤8 chars, read-only)
+FLUKA_NEUTRON_LIBS = MappingProxyType({
     'JEFF': 'JEFF-3.3',   # must match run_fluka.sh (8 chars max)
     'ENDF': 'ENDFB8.0',
     'JENDL': 'JENDL4.0',
     'CENDL': 'CENDL3.1',
     'BROND': 'BROND3.1',
-}
+})
 
 
-def validate_config(config: SimulationConfig) -> List[str]:
-    """Validate configuration and return list of warnings/errors."""
-    issues = []
+def _file_exists(path: str) -> bool:
+    """os.path.exists without the path normalisation."""
+    try:
+        os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return True
 
-    # Check particle type
-    if config.particle.type.lower() not in FLUKA_PARTICLES:
-        issues.append(f"Unknown particle type: {config.particle.type}")
 
-    # Check GDML file exists
-    if not os.path.exists(config.geometry_gdml):
-        issues.append(f"GDML file not found: {config.geometry_gdml}")
+# (predicate, message) pairs run by validate_config(); a message is
+# formatted with the config as c when its predicate fails
+CONFIG_CHECKS = (
+    (lambda c: c.particle.type_key in FLUKA_PARTICLES, "Unknown particle type: {c.particle.type}"),
+    (lambda c: _file_exists(c.geometry_gdml), "GDML file not found: {c.geometry_gdml}"),
+    (lambda c: c.events >= 1, "Events must be >= 1"),
+)
 
-    # Check neutron libraries
-    for lib in config.fluka.neutron_libraries:
-        if lib not in FLUKA_NEUTRON_LIBS:
-            issues.append(f"Unknown FLUKA neutron library: {lib}")
 
-    # Check events count
-    if config.events < 1:
-        issues.append("Events must be >= 1")
+def validate_config(config: SimulationConfig) -> List[str]:
+    """Validate configuration and return list of warnings/errors."""
+    issues = [message.format(c=config) for check, message in CONFIG_CHECKS if not check(config)]
+
+    # Check neutron libraries (one issue per unknown library)
+    issues.extend(
+        f"Unknown FLUKA neutron library: {lib}"
+        for lib in config.fluka.neutron_libraries
+        if lib not in FLUKA_NEUTRON_LIBS
+    )
 
     return issues
@@ -5,14 +5,23 @@ Uses the proven neutron_bpe.inp as a template, patching energy and
 neutron library selection - same approach as run_fluka.sh.
 """
 
+import functools
 import os
 import re
-import shutil
-from .config_parser import SimulationConfig, FLUKA_PARTICLES, FLUKA_NEUTRON_LIBS
+from .config_parser import SimulationConfig, FLUKA_NEUTRON_LIBS
+from .paths import ensure_parent_dir
 
 # Path to the working template input file (relative to project root)
 DEFAULT_TEMPLATE = "neutron_bpe.inp"
 
+# Fixed-format cards written by patch_fluka_input.
+# BEAM: positive WHAT(1) = kinetic energy in GeV, negative = momentum in GeV/c
+BEAM_CARD = "BEAM      %10.4E       0.0       0.0       0.0       0.0       1.0%s\n"
+# LOW-PWXS: WHAT(1)=1 activates pointwise xsec, SDUM=library
+LOW_PWXS_CARD = "LOW-PWXS       1.0       0.0       0.0       0.0       0.0       0.0%-8s\n"
+# START: primaries per cycle
+START_CARD = "START     %9.1f\n"
+
 
 def patch_fluka_input(
     template_path: str,
@@ -44,50 +53,87 @@ def patch_fluka_input(
     Returns:
         output_path
     """
-    with open(template_path, 'r') as f:
-        lines = f.readlines()
-
-    # FLUKA BEAM card: positive WHAT(1) = kinetic energy in GeV,
-    #                   negative WHAT(1) = momentum in GeV/c
-    energy_str = f"{energy_gev:10.4E}"
-
-    patched = []
-    for line in lines:
-        keyword = line[:10].strip()
-
-        # Replace BEAM energy and particle type
-        if keyword == "BEAM":
-            patched.append(f"BEAM      {energy_str}       0.0       0.0       0.0       0.0       1.0{particle}\n")
-            continue
-
-        # Remove any existing LOW-PWXS card (will re-add it)
-        if keyword == "LOW-PWXS":
-            continue
-
-        # Insert LOW-PWXS and updated START immediately before RANDOMIZ
-        if keyword == "RANDOMIZ":
-            # LOW-PWXS card: WHAT(1)=1 activates pointwise xsec, SDUM=library
-            pwxs = (
-                f"LOW-PWXS       1.0       0.0       0.0       0.0       0.0       0.0"
-                f"{lib_sdum:<8}\n"
-            )
-            patched.append(pwxs)
-
-        # Replace START count
-        if keyword == "START":
-            events_per_cycle = max(1, events // cycles)
-            patched.append(f"START     {events_per_cycle:>9.1f}\n")
-            continue
-
-        patched.append(line)
-
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-    with open(output_path, 'w') as f:
-        f.writelines(patched)
+    beam_card = BEAM_CARD % (energy_gev, particle)
+    pwxs_card = LOW_PWXS_CARD % lib_sdum
+    start_card = START_CARD % max(1, events // cycles)
+
+    # Keyword -> (text written in its place, whether the template line is kept):
+    # - Replace BEAM energy and particle type
+    # - Remove any existing LOW-PWXS card (re-added before RANDOMIZ)
+    # - Insert LOW-PWXS immediately before RANDOMIZ
+    # - Replace START count
+    patches = {
+        "BEAM": (beam_card, False),
+        "LOW-PWXS": ("", False),
+        "RANDOMIZ": (pwxs_card, True),
+        "START": (start_card, False),
+    }
+
+    # Cards start in column 1, so most lines are rejected by one C-level
+    # prefix test before any keyword is sliced out
+    keywords = tuple(patches)
+
+    # Stream the template straight into the output, one line at a time
+    ensure_parent_dir(output_path)
+    with open(template_path, 'r') as f_in, open(output_path, 'w') as f_out:
+        for line in f_in:
+            patch = patches.get(line[:10].strip()) if line.startswith(keywords) else None
+            if patch is None:
+                f_out.write(line)
+                continue
+            card, keep = patch
+            f_out.write(card)
+            if keep:
+                f_out.write(line)
 
     return output_path
 
 
+def render_native_input(template_path: str, energy_gev: float,
+                        particle: str = "NEUTRON") -> str:
+    """
+    Text of the template patched for a native-geometry FLUKA run.
+
+    Does in Python what run_fluka.sh does with sed: replaces the BEAM card
+    (printf "%10.4E" energy) and drops any LOW-PWXS card, since pointwise
+    libraries are not installed in the container. START and RANDOMIZ are
+    left as in the template. Renders are cached per template version, so
+    runs of several libraries read the template once.
+
+    Args:
+        template_path: Path to the template .inp file
+        energy_gev:    Beam energy in GeV
+        particle:      FLUKA particle name
+
+    Returns:
+        The patched input file contents
+    """
+    st = os.stat(template_path)
+    return _render_native(os.path.abspath(template_path), st.st_mtime_ns, st.st_size,
+                          energy_gev, particle)
+
+
+@functools.lru_cache(maxsize=32)
+def _render_native(template_path: str, mtime_ns: int, size: int,
+                   energy_gev: float, particle: str) -> str:
+    """Cached body of render_native_input(); mtime/size key the template version."""
+    beam_card = BEAM_CARD % (energy_gev, particle)
+    out = []
+    with open(template_path, 'r') as f:
+        for line in f:
+            if line.startswith("BEAM "):
+                out.append(beam_card)
+            elif not line.startswith("LOW-PWXS"):
+                out.append(line)
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=64)
+def resolve_lib_sdum(neutron_library: str) -> str:
+    """LOW-PWXS SDUM for a library key; unknown keys are cut to 8 chars."""
+    return FLUKA_NEUTRON_LIBS.get(neutron_library, neutron_library[:8])
+
+
 def generate_fluka_input_native(
     config: SimulationConfig,
     neutron_library: str,
@@ -112,16 +158,13 @@ def generate_fluka_input_native(
             "Pass template_path= pointing to a working FLUKA .inp file."
         )
 
-    lib_sdum = FLUKA_NEUTRON_LIBS.get(neutron_library, neutron_library[:8])
-    fluka_particle = FLUKA_PARTICLES.get(
-        config.particle.type.lower(), config.particle.type.upper()
-    )
+    lib_sdum = resolve_lib_sdum(neutron_library)
 
     return patch_fluka_input(
         template_path=template_path,
         output_path=output_path,
         energy_gev=config.particle.energy_gev,
-        particle=fluka_particle,
+        particle=config.particle.fluka_name,
         lib_sdum=lib_sdum,
         events=config.events,
         cycles=config.fluka.cycles,
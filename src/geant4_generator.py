@@ -4,9 +4,10 @@ Geant4 macro file generator for the comparison framework.
 Generates Geant4 macro files from simulation configuration.
 """
 
-import os
+from dataclasses import asdict
 from typing import Optional
-from .config_parser import SimulationConfig, GEANT4_PARTICLES
+from .config_parser import SimulationConfig
+from .paths import ensure_parent_dir
 
 
 def generate_geant4_macro(
@@ -29,91 +30,81 @@ def generate_geant4_macro(
     scoring = config.scoring
 
     # Get Geant4 particle name
-    g4_particle = GEANT4_PARTICLES.get(
-        particle.type.lower(), particle.type.lower()
-    )
+    g4_particle = particle.geant4_name
 
     # Energy in MeV (Geant4 default units)
     energy_mev = particle.energy_mev
 
-    lines = []
-
-    # Header comment
-    lines.append(f"# Geant4 macro for comparison framework")
-    lines.append(f"# Physics list: {physics_list}")
-    lines.append("")
-
-    # Verbosity
-    lines.append("# Verbosity settings")
-    lines.append("/control/verbose 0")
-    lines.append("/run/verbose 0")
-    lines.append("/event/verbose 0")
-    lines.append("/tracking/verbose 0")
-    lines.append("")
-
-    # Initialize (physics list set via command line)
-    lines.append("# Initialize run")
-    lines.append("/run/initialize")
-    lines.append("")
-
-    # Production cuts
-    lines.append("# Production cuts")
-    lines.append(f"/run/setCut {config.geant4.cut_value} mm")
-    lines.append("")
-
-    # Particle gun setup
-    lines.append("# Particle gun configuration")
-    lines.append(f"/gun/particle {g4_particle}")
-    lines.append(f"/gun/energy {energy_mev} MeV")
+    edep = scoring.energy_deposition
+    spec = scoring.neutron_spectrum
 
     x, y, z = particle.position
-    lines.append(f"/gun/position {x} {y} {z} cm")
-
     dx, dy, dz = particle.direction
-    lines.append(f"/gun/direction {dx} {dy} {dz}")
-    lines.append("")
-
-    # Scoring setup (via custom commands in the application)
-    if scoring.energy_deposition.get('enabled', True):
-        edep = scoring.energy_deposition
-        lines.append("# Energy deposition scoring")
-        lines.append(f"/scoring/edep/xBins {edep.get('x_bins', 1)}")
-        lines.append(f"/scoring/edep/yBins {edep.get('y_bins', 1)}")
-        lines.append(f"/scoring/edep/zBins {edep.get('z_bins', 100)}")
-        x_range = edep.get('x_range', [-100, 100])
-        y_range = edep.get('y_range', [-100, 100])
-        z_range = edep.get('z_range', [0, 2])
-        lines.append(f"/scoring/edep/xRange {x_range[0]} {x_range[1]} cm")
-        lines.append(f"/scoring/edep/yRange {y_range[0]} {y_range[1]} cm")
-        lines.append(f"/scoring/edep/zRange {z_range[0]} {z_range[1]} cm")
-        lines.append("")
-
-    if scoring.neutron_spectrum.get('enabled', True):
-        spec = scoring.neutron_spectrum
-        lines.append("# Neutron spectrum scoring")
-        lines.append(f"/scoring/spectrum/nBins {spec.get('energy_bins', 100)}")
-        e_range = spec.get('energy_range', [1e-11, 1e1])
-        # Convert to MeV for Geant4
-        lines.append(f"/scoring/spectrum/eMin {e_range[0] * 1000} MeV")
-        lines.append(f"/scoring/spectrum/eMax {e_range[1] * 1000} MeV")
-        lines.append("")
-
-    # Random seed
-    if config.seed > 0:
-        lines.append("# Random seed")
-        lines.append(f"/random/setSeeds {config.seed} {config.seed + 1}")
-        lines.append("")
-
-    # Run
-    lines.append("# Run simulation")
-    lines.append(f"/run/beamOn {config.events}")
-    lines.append("")
-
-    # Write to file
-    content = "\n".join(lines)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, 'w') as f:
-        f.write(content)
+
+    # Write each line straight to the file
+    ensure_parent_dir(output_path)
+    with open(output_path, 'w', buffering=64 * 1024) as f:
+        w = f.write
+
+        # Header comment
+        w("# Geant4 macro for comparison framework\n")
+        w(f"# Physics list: {physics_list}\n")
+        w("\n")
+
+        # Verbosity
+        w("# Verbosity settings\n")
+        w("/control/verbose 0\n")
+        w("/run/verbose 0\n")
+        w("/event/verbose 0\n")
+        w("/tracking/verbose 0\n")
+        w("\n")
+
+        # Initialize (physics list set via command line)
+        w("# Initialize run\n")
+        w("/run/initialize\n")
+        w("\n")
+
+        # Production cuts
+        w("# Production cuts\n")
+        w(f"/run/setCut {config.geant4.cut_value} mm\n")
+        w("\n")
+
+        # Particle gun setup
+        w("# Particle gun configuration\n")
+        w(f"/gun/particle {g4_particle}\n")
+        w(f"/gun/energy {energy_mev} MeV\n")
+        w(f"/gun/position {x} {y} {z} cm\n")
+        w(f"/gun/direction {dx} {dy} {dz}\n")
+        w("\n")
+
+        # Scoring setup (via custom commands in the application)
+        if edep.enabled:
+            w("# Energy deposition scoring\n")
+            w(f"/scoring/edep/xBins {edep.x_bins}\n")
+            w(f"/scoring/edep/yBins {edep.y_bins}\n")
+            w(f"/scoring/edep/zBins {edep.z_bins}\n")
+            w(f"/scoring/edep/xRange {edep.x_range[0]} {edep.x_range[1]} cm\n")
+            w(f"/scoring/edep/yRange {edep.y_range[0]} {edep.y_range[1]} cm\n")
+            w(f"/scoring/edep/zRange {edep.z_range[0]} {edep.z_range[1]} cm\n")
+            w("\n")
+
+        if spec.enabled:
+            w("# Neutron spectrum scoring\n")
+            w(f"/scoring/spectrum/nBins {spec.energy_bins}\n")
+            # Convert to MeV for Geant4
+            w(f"/scoring/spectrum/eMin {spec.energy_range[0] * 1000} MeV\n")
+            w(f"/scoring/spectrum/eMax {spec.energy_range[1] * 1000} MeV\n")
+            w("\n")
+
+        # Random seed
+        if config.seed > 0:
+            w("# Random seed\n")
+            w(f"/random/setSeeds {config.seed} {config.seed + 1}\n")
+            w("\n")
+
+        # Run
+        w("# Run simulation\n")
+        w(f"/run/beamOn {config.events}\n")
 
     return output_path
 
@@ -142,9 +133,7 @@ def generate_geant4_config_json(
     particle = config.particle
     scoring = config.scoring
 
-    g4_particle = GEANT4_PARTICLES.get(
-        particle.type.lower(), particle.type.lower()
-    )
+    g4_particle = particle.geant4_name
 
     cfg = {
         "physics_list": physics_list,
@@ -159,12 +148,12 @@ def generate_geant4_config_json(
         "cut_mm": config.geant4.cut_value,
         "seed": config.seed,
         "scoring": {
-            "energy_deposition": scoring.energy_deposition,
-            "neutron_spectrum": scoring.neutron_spectrum,
+            "energy_deposition": asdict(scoring.energy_deposition),
+            "neutron_spectrum": asdict(scoring.neutron_spectrum),
         },
     }
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    ensure_parent_dir(output_path)
     with open(output_path, 'w') as f:
         json.dump(cfg, f, indent=2)
 
@@ -0,0 +1,108 @@
+"""
+Batch generation of run input files for the comparison framework.
+
+Writes the FLUKA input (fluka/<library>/input.inp) and Geant4 macro
+(geant4/<physics list>/run.mac) of every run in a simulation config,
+with the runs spread over worker processes.
+
+Usage:
+    python -m src.generate_runs --config config/simulation_config.yaml
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from .config_parser import SimulationConfig
+from .fluka_generator import generate_fluka_input, DEFAULT_TEMPLATE
+from .geant4_generator import generate_geant4_macro
+
+
+def _generate_one(job: tuple) -> str:
+    """
+    Generate the input file of a single run (worker entry point).
+
+    Workers receive the YAML path rather than a pickled SimulationConfig
+    and reload it, which the config cache makes a single parse per process.
+    """
+    yaml_path, run, out_root, template_path = job
+    config = SimulationConfig.from_yaml(yaml_path)
+    output_dir = os.path.join(out_root, run['output_subdir'])
+
+    if run['code'] == 'fluka':
+        input_file = os.path.join(output_dir, 'input.inp')
+        return generate_fluka_input(config, run['model'], input_file, template_path)
+    return generate_geant4_macro(config, run['model'], os.path.join(output_dir, 'run.mac'))
+
+
+def generate_all(
+    yaml_path: str,
+    runs: Optional[List[Dict]] = None,
+    out_root: Optional[str] = None,
+    template_path: str = DEFAULT_TEMPLATE,
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Generate the input files of many runs in parallel.
+
+    Args:
+        yaml_path: Simulation configuration YAML
+        runs: Run dicts as from get_run_configs() (None = all runs in the config)
+        out_root: Base output directory (None = the config's output_dir)
+        template_path: FLUKA template .inp file
+        max_workers: Worker processes (None = one per CPU)
+
+    Returns:
+        Paths of the generated files, in run order
+    """
+    config = SimulationConfig.from_yaml(yaml_path)
+    if runs is None:
+        runs = config.get_run_configs()
+    if out_root is None:
+        out_root = config.output_dir
+
+    jobs = [(yaml_path, run, out_root, template_path) for run in runs]
+    if len(jobs) <= 1 or max_workers == 1:
+        return [_generate_one(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_generate_one, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate FLUKA inputs and Geant4 macros for all runs"
+    )
+    parser.add_argument(
+        '--config', '-c',
+        default='config/simulation_config.yaml',
+        help='Path to simulation configuration YAML'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        help='Base output directory (default: output_dir from the config)'
+    )
+    parser.add_argument(
+        '--template',
+        default=DEFAULT_TEMPLATE,
+        help=f'FLUKA template input file (default: {DEFAULT_TEMPLATE})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: one per CPU)'
+    )
+
+    args = parser.parse_args()
+
+    paths = generate_all(args.config, out_root=args.output,
+                         template_path=args.template, max_workers=args.workers)
+    for path in paths:
+        print(f"  {path}")
+    print(f"Generated {len(paths)} input files")
+
+
+if __name__ == '__main__':
+    main()
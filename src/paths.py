@@ -0,0 +1,32 @@
+"""
+Filesystem helpers shared by the input generators.
+"""
+
+import os
+
+
+def ensure_dir(directory: str) -> str:
+    """
+    Create directory (and parents) if it does not exist.
+
+    Args:
+        directory: Directory path
+
+    Returns:
+        directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def ensure_parent_dir(path: str) -> str:
+    """
+    Create the parent directory of path if needed.
+
+    Args:
+        path: File path about to be written
+
+    Returns:
+        The parent directory
+    """
+    return ensure_dir(os.path.dirname(path) or ".")
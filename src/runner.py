@@ -4,26 +4,58 @@ Docker execution runner for FLUKA and Geant4 simulations.
 Handles container management, volume mounting, and result collection.
 """
 
+import csv
+import hashlib
+import io
+import json
 import os
+import sys
 import subprocess
-import shutil
+import shlex
+import threading
 import time
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple
-from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 
 from .config_parser import SimulationConfig, FLUKA_NEUTRON_LIBS
+from .fluka_generator import render_native_input
 
 
 # Docker image names
 FLUGG_IMAGE = "flugg:latest"
 GEANT4_IMAGE = "comparison_app:latest"  # built from docker/Dockerfile.comparison
-FLUKA_IMAGE = "fluka:ggi"
+FLUKA_IMAGE = "fluka-study:latest"  # fluka:ggi + gfortran, built from docker/Dockerfile.fluka
 
 # Default FLUKA template (relative to working directory when run_comparison.py is invoked)
 DEFAULT_FLUKA_TEMPLATE = "neutron_bpe.inp"
 
+# Bind-mount consistency for writable volumes. On macOS every container
+# write to a bind mount otherwise round-trips to the host VM; 'delegated'
+# lets the container's view lead. Safe here because results are only read
+# after the container has exited. Native Linux mounts ignore it.
+DEFAULT_CONSISTENCY = 'delegated' if sys.platform == 'darwin' else ''
+# Read-only mounts (the GDML geometry) are host-authoritative and only
+# read, so the host's view may lead instead
+DEFAULT_RO_CONSISTENCY = 'cached' if sys.platform == 'darwin' else ''
+
+# Where persistent containers mount the host directory shared by all runs
+HOST_MOUNT = "/host"
+
+# Seconds docker waits after SIGTERM before killing a stopping container
+STOP_TIMEOUT = 10
+
+# Extra seconds the host waits beyond a run's in-container timeout
+TIMEOUT_GRACE = 60
+
+# Written to a run's output directory after it succeeds: the hash of its
+# inputs, letting later sweeps skip the run while they are unchanged
+CACHE_KEY_FILE = ".cache_key"
+
+# Memory one simulation container needs; FLUKA maps ~2 GB of cross-section
+# data per process
+RUN_MEMORY_BYTES = 2 * 2**30
+
 
 @dataclass
 class RunResult:
@@ -36,191 +68,664 @@ class RunResult:
     error_message: Optional[str] = None
 
 
+# Bytes of a streamed stderr file reported as a failed run's error message
+ERROR_TAIL_BYTES = 4096
+
+
+def _read_tail(path: str, nbytes: int = ERROR_TAIL_BYTES) -> str:
+    """Last nbytes of a file, decoded leniently ('' if it does not exist)."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - nbytes))
+            return f.read().decode(errors='replace')
+    except OSError:
+        return ""
+
+
+def _kill_container(container: Optional[str]) -> None:
+    """docker kill a timed-out run's container (killing the client leaves it running)."""
+    if container:
+        subprocess.run(["docker", "kill", container],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _tee(src, out, chunk_size: int = 8192) -> None:
+    """Copy a pipe to a file and to the terminal until EOF, chunk by chunk."""
+    terminal = sys.stdout.buffer
+    for chunk in iter(lambda: src.read1(chunk_size), b""):
+        out.write(chunk)
+        terminal.write(chunk)
+        terminal.flush()
+
+
 def run_command(cmd: List[str], cwd: Optional[str] = None,
-                timeout: int = 3600) -> Tuple[int, str, str]:
-    """Run a command and return (returncode, stdout, stderr)."""
+                timeout: int = 3600,
+                stdout_path: Optional[str] = None,
+                stderr_path: Optional[str] = None,
+                container: Optional[str] = None,
+                echo: bool = False,
+                input: Optional[str] = None) -> Tuple[int, str, str]:
+    """
+    Run a command and return (returncode, stdout, stderr).
+
+    With stdout_path/stderr_path the output streams straight to those
+    files instead of being held in memory; the returned stdout is then ''
+    and stderr is the tail of the stderr file, read only on failure.
+    With echo, stdout is also shown on the terminal as it arrives.
+    input, if given, is written to the command's stdin.
+    On timeout the named docker container, if any, is killed too.
+    """
+    if stdout_path is None and stderr_path is None:
+        try:
+            result = subprocess.run(
+                cmd,
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                input=input,
+            )
+            return result.returncode, result.stdout, result.stderr
+        except subprocess.TimeoutExpired:
+            _kill_container(container)
+            return -1, "", f"Command timed out after {timeout} seconds"
+        except Exception as e:
+            return -1, "", str(e)
+
     try:
-        result = subprocess.run(
-            cmd,
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-        return result.returncode, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", f"Command timed out after {timeout} seconds"
+        with open(stdout_path or os.devnull, 'wb') as out, \
+                open(stderr_path or os.devnull, 'wb') as err:
+            proc = subprocess.Popen(cmd, cwd=cwd, stderr=err,
+                                    stdout=subprocess.PIPE if echo else out,
+                                    stdin=subprocess.PIPE if input is not None else None)
+            if input is not None:
+                with proc.stdin:
+                    proc.stdin.write(input.encode())
+            # The copy runs on a thread so wait() can still time out
+            tee = threading.Thread(target=_tee, args=(proc.stdout, out), daemon=True) if echo else None
+            if tee:
+                tee.start()
+            try:
+                returncode = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                _kill_container(container)
+                return -1, "", f"Command timed out after {timeout} seconds"
+            finally:
+                if tee:
+                    tee.join(timeout=5)
+                    proc.stdout.close()
+    except Exception as e:
+        return -1, "", str(e)
+
+    stderr = _read_tail(stderr_path) if returncode != 0 and stderr_path else ""
+    return returncode, "", stderr
+
+
+async def run_command_async(cmd: List[str], cwd: Optional[str] = None,
+                            timeout: int = 3600,
+                            stdout_path: Optional[str] = None,
+                            stderr_path: Optional[str] = None,
+                            container: Optional[str] = None,
+                            input: Optional[str] = None) -> Tuple[int, str, str]:
+    """Async counterpart of run_command(), for use on an event loop."""
+    import asyncio
+
+    streamed = stdout_path is not None or stderr_path is not None
+    try:
+        if streamed:
+            out = open(stdout_path or os.devnull, 'wb')
+            err = open(stderr_path or os.devnull, 'wb')
+        else:
+            out = err = asyncio.subprocess.PIPE
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=cwd,
+                stdin=asyncio.subprocess.PIPE if input is not None else None,
+                stdout=out,
+                stderr=err,
+            )
+        finally:
+            # The child holds its own descriptors once spawned
+            if streamed:
+                out.close()
+                err.close()
     except Exception as e:
         return -1, "", str(e)
 
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            proc.communicate(input.encode() if input is not None else None), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        if container:
+            kill = await asyncio.create_subprocess_exec(
+                "docker", "kill", container,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+            await kill.wait()
+        return -1, "", f"Command timed out after {timeout} seconds"
+
+    if streamed:
+        returncode = proc.returncode
+        stderr = _read_tail(stderr_path) if returncode != 0 and stderr_path else ""
+        return returncode, "", stderr
+
+    return (proc.returncode,
+            stdout.decode(errors='replace'),
+            stderr.decode(errors='replace'))
+
+
+@dataclass
+class DockerJob:
+    """A prepared simulation run: the docker command and where results go."""
+    code: str                                   # 'fluka' or 'geant4'
+    model: str                                  # neutron library or physics list
+    output_dir: str
+    cmd: List[str]
+    timeout: int = 3600                         # seconds before the run is killed
+    log_file: Optional[str] = None              # stdout streamed here
+    err_file: Optional[str] = None              # stderr streamed here
+
+    @property
+    def container(self) -> Optional[str]:
+        """Name of the container cmd starts (None for docker exec)."""
+        if self.cmd[:2] == ["docker", "run"] and "--name" in self.cmd:
+            return self.cmd[self.cmd.index("--name") + 1]
+        return None
+
+
+@dataclass
+class DockerOptions:
+    """Host-side settings shared by every docker command of a runner."""
+    consistency: str = DEFAULT_CONSISTENCY   # '', 'delegated', 'cached' or 'consistent'
+    ro_consistency: str = DEFAULT_RO_CONSISTENCY  # the same, for read-only mounts
+    scratch_size: str = '2g'                 # tmpfs size for FLUKA scratch; '' = no tmpfs
+    isolate_network: bool = True             # --network=none unless a job needs the network
+    # Resource limits of fresh containers (None = docker default)
+    cpus: Optional[int] = None               # --cpus
+    cpuset: Optional[str] = None             # --cpuset-cpus, e.g. '0-3'
+    memory: Optional[str] = None             # --memory, e.g. '4g'
+    # Persistent containers (image -> container name) that jobs docker-exec
+    # into, and the (host_path, container_path, read_only) mounts they share
+    containers: Dict[str, str] = field(default_factory=dict)
+    mounts: List[Tuple[str, str, bool]] = field(default_factory=list)
+    # Image tag -> image ID resolved once per sweep, so every run of the
+    # sweep uses the same image even if the tag moves
+    images: Dict[str, str] = field(default_factory=dict)
+
+    def volume(self, host_path: str, container_path: str, read_only: bool = False) -> List[str]:
+        """-v arguments for a bind mount with the consistency for its access mode."""
+        consistency = self.ro_consistency if read_only else self.consistency
+        modes = (['ro'] if read_only else []) + ([consistency] if consistency else [])
+        spec = f"{host_path}:{container_path}"
+        if modes:
+            spec += ":" + ",".join(modes)
+        return ["-v", spec]
+
+    def scratch(self, container_path: str) -> List[str]:
+        """--tmpfs arguments putting a scratch directory in RAM, if enabled."""
+        if not self.scratch_size:
+            return []
+        return ["--tmpfs", f"{container_path}:rw,size={self.scratch_size},mode=1777"]
+
+    def network(self, needs_network: bool = False) -> List[str]:
+        """--network=none for containers that never touch the network."""
+        return ["--network=none"] if self.isolate_network and not needs_network else []
+
+    def limits(self, cpus: Optional[int] = None) -> List[str]:
+        """--cpus/--cpuset-cpus/--memory arguments; cpus overrides self.cpus."""
+        args = []
+        cpus = cpus or self.cpus
+        if cpus:
+            args.append(f"--cpus={cpus}")
+        if self.cpuset:
+            args.append(f"--cpuset-cpus={self.cpuset}")
+        if self.memory:
+            args.append(f"--memory={self.memory}")
+        return args
+
+    def slots(self, n: int) -> List['DockerOptions']:
+        """
+        Per-slot copies of these options splitting the host between n runs.
+
+        Slot i gets its own block of CPU cores (--cpus and --cpuset-cpus)
+        and an equal share of physical memory, so concurrent runs do not
+        compete for cores and caches.
+        """
+        total = os.cpu_count() or 1
+        per_slot = max(1, total // n)
+        try:
+            memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // n
+        except (ValueError, OSError, AttributeError):
+            memory = 0
+        slots = []
+        for i in range(n):
+            first = (i * per_slot) % total
+            last = min(first + per_slot, total) - 1
+            slots.append(replace(
+                self,
+                cpus=per_slot,
+                cpuset=str(first) if first == last else f"{first}-{last}",
+                memory=f"{memory // 2**20}m" if memory else None,
+            ))
+        return slots
+
+    def mount_path(self, image: str, host_path: str, container_path: str) -> str:
+        """
+        Where host_path is seen inside a job's container.
+
+        A fresh container mounts it at container_path; a persistent one
+        sees it under whichever of its mounts holds it.
+        """
+        if image not in self.containers:
+            return container_path
+        # The deepest mount wins, e.g. outputs kept inside the template directory
+        for mount_host, mount_container, _ in sorted(self.mounts, key=lambda m: -len(m[0])):
+            if host_path == mount_host:
+                return mount_container
+            if host_path.startswith(mount_host.rstrip(os.sep) + os.sep):
+                return f"{mount_container}/{os.path.relpath(host_path, mount_host)}"
+        raise RuntimeError(
+            f"{host_path} is not mounted in persistent container {self.containers[image]}")
+
+    def command(
+        self,
+        image: str,
+        mounts: List[Tuple[str, str, bool]],
+        workdir: str,
+        env: Optional[Dict[str, str]] = None,
+        scratch: Optional[str] = None,
+        cpus: Optional[int] = None,
+        needs_network: bool = False,
+        stdin: bool = False,
+    ) -> List[str]:
+        """
+        docker argv up to and including the image (or container) name.
+
+        Args:
+            image: Image the job runs in
+            mounts: (host_path, container_path, read_only) bind mounts
+            workdir: Working directory inside the container
+            env: Environment variables for the job
+            scratch: Container directory to put on tmpfs
+            cpus: CPU limit for a fresh container, overriding self.cpus
+                (ignored for docker exec)
+            needs_network: Keep the default network even when isolating
+            stdin: Attach the job's stdin (-i)
+
+        Returns:
+            'docker run --rm ... image', or 'docker exec ... container' when
+            a persistent container for the image is running
+        """
+        env_args = [arg for k, v in (env or {}).items() for arg in ("-e", f"{k}={v}")]
+        if stdin:
+            env_args.insert(0, "-i")
+        container = self.containers.get(image)
+        if container is not None:
+            return ["docker", "exec", *env_args, "-w", workdir, container]
+
+        # Named so a timed-out run can be docker-killed; stop is bounded
+        cmd = ["docker", "run", "--rm", "--name", f"fluka-study-{os.urandom(6).hex()}",
+               f"--stop-timeout={STOP_TIMEOUT}"]
+        cmd += self.network(needs_network)
+        cmd += self.limits(cpus)
+        if scratch:
+            cmd += self.scratch(scratch)
+        for host_path, container_path, read_only in mounts:
+            cmd += self.volume(host_path, container_path, read_only)
+        return cmd + [*env_args, "-w", workdir, self.images.get(image, image)]
+
+
+def effective_workers(max_workers: int, n_tasks: int) -> int:
+    """
+    Parallel runs the host can take without over-subscription.
+
+    Caps max_workers at the number of tasks, half the CPU cores, and
+    the available memory at RUN_MEMORY_BYTES per run. Running more
+    containers than that only adds memory pressure and contention on
+    the shared data mount.
+
+    Args:
+        max_workers: Requested parallel workers
+        n_tasks: Number of runs to execute
+
+    Returns:
+        The number of workers to use (at least 1)
+    """
+    workers = min(max_workers, n_tasks, max(1, (os.cpu_count() or 1) // 2))
+    try:
+        available = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        available = 0
+    if available:
+        workers = min(workers, available // RUN_MEMORY_BYTES)
+    return max(1, workers)
+
+
+def _job_result(job: DockerJob, returncode: int, stderr: str, runtime: float) -> RunResult:
+    """RunResult for a finished job."""
+    return RunResult(
+        code=job.code,
+        model=job.model,
+        success=(returncode == 0),
+        output_dir=job.output_dir,
+        runtime_seconds=runtime,
+        error_message=stderr if returncode != 0 else None,
+    )
+
+
+def execute_job(job: DockerJob, echo: bool = False) -> RunResult:
+    """Run a prepared job to completion (blocking); echo shows its output live."""
+    start_time = time.time()
+
+    returncode, _, stderr = run_command(job.cmd, timeout=job.timeout,
+                                        stdout_path=job.log_file,
+                                        stderr_path=job.err_file,
+                                        container=job.container,
+                                        echo=echo)
+
+    return _job_result(job, returncode, stderr, time.time() - start_time)
+
+
+async def execute_job_async(job: DockerJob) -> RunResult:
+    """
+    Run a prepared job on the event loop.
+
+    The docker client is awaited rather than blocking a thread, and its
+    output goes straight to the job's log files.
+    """
+    start_time = time.time()
+
+    returncode, _, stderr = await run_command_async(job.cmd, timeout=job.timeout,
+                                                    stdout_path=job.log_file,
+                                                    stderr_path=job.err_file,
+                                                    container=job.container)
+
+    return _job_result(job, returncode, stderr, time.time() - start_time)
+
+
+def _stage_input(src: str, dst: str) -> None:
+    """
+    Make src available at dst for a run.
+
+    Hardlinks when src and dst share a filesystem and copies otherwise;
+    nothing is done if dst already is src. Symlinks are not used because
+    their host-side target is not visible inside the container.
+    """
+    # run_all() generates FLUGG inputs in place; no stat needed then
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
+        shutil.copy(src, dst)
+
+
+# Name of the rendered script in a native run's output directory
+NATIVE_SCRIPT = "run.sh"
+
+# Script run by native FLUKA containers: a %-template header holding the
+# per-run settings, then a fixed body (no interpolation, so bash's own
+# braces and % need no escaping)
+FLUKA_NATIVE_HEADER = '''set -e
+# FLUPRO and FLUFOR come from the image (docker/Dockerfile.fluka)
+INPUT_FILE="%(input_file)s"
+INPUT_BASE="${INPUT_FILE%%.inp}"
+CYCLES=%(cycles)d
+CPUS=%(cpus)d
+ENERGY_GEV=%(energy_gev)s
+OUTPUT_DIR="%(output_dir)s"
+'''
+
+FLUKA_NATIVE_BODY = r'''# Private work directory, so runs sharing a container do not collide
+mkdir -p /fluka_work
+WORK_DIR=$(mktemp -d /fluka_work/run.XXXXXX)
+trap 'rm -rf "$WORK_DIR"' EXIT
+cd "$WORK_DIR"
+# Input patched on the host (BEAM energy set, LOW-PWXS removed)
+cp $OUTPUT_DIR/$INPUT_FILE .
+echo "Set neutron energy to $ENERGY_GEV GeV"
+echo "FLUKA path: $FLUPRO"
+echo "Running simulation with rfluka..."
+# Run rfluka with error handling (same pattern as run_fluka.sh).
+# With CPUS > 1 the cycles run concurrently as independent one-cycle
+# jobs, each in its own directory with its own RANDOMIZ seed; their
+# outputs are renamed to the usual per-cycle names for the merge.
+if [ "$CPUS" -gt 1 ]; then
+  run_cycle() {
+    local d=cycle_$1 tag rc
+    tag=$(printf '%03d' $1)
+    mkdir -p $d
+    sed "s/^RANDOMIZ.*/$(printf 'RANDOMIZ  %10.1f%10.1f' 1.0 $1)/" $INPUT_FILE > $d/$INPUT_FILE
+    (cd $d && $FLUPRO/bin/rfluka -N0 -M1 $INPUT_BASE); rc=$?
+    for f in $d/${INPUT_BASE}001*; do
+      [ -e "$f" ] && mv "$f" "${INPUT_BASE}${tag}${f#$d/${INPUT_BASE}001}"
+    done
+    return $rc
+  }
+  export -f run_cycle
+  export FLUPRO FLUFOR INPUT_FILE INPUT_BASE
+  seq 1 $CYCLES | xargs -P $CPUS -I{} bash -c 'run_cycle {}'
+else
+  $FLUPRO/bin/rfluka -N0 -M${CYCLES} ${INPUT_BASE}
+fi || {
+  echo ""
+  echo "=== FLUKA run failed. Checking logs ==="
+  echo "--- .out file ---"
+  cat ${INPUT_BASE}001.out 2>/dev/null | tail -100 || echo "No .out file"
+  echo "--- .err file ---"
+  cat ${INPUT_BASE}001.err 2>/dev/null || echo "No .err file"
+  echo "--- .log file ---"
+  cat ${INPUT_BASE}001.log 2>/dev/null || echo "No .log file"
+  mkdir -p $OUTPUT_DIR
+  cp -f *.out $OUTPUT_DIR/ 2>/dev/null || true
+  cp -f *.err $OUTPUT_DIR/ 2>/dev/null || true
+  cp -f *.log $OUTPUT_DIR/ 2>/dev/null || true
+  exit 1
+}
+echo ""
+echo "Simulation complete. Processing output..."
+# Collect the per-cycle files with one glob each (no per-cycle test)
+shopt -s nullglob
+files21=(${INPUT_BASE}???_fort.21)
+files23=(${INPUT_BASE}???_fort.23)
+shopt -u nullglob
+# Merge and convert to ASCII USRBIN (unit 21) and USRBDX (unit 23)
+# concurrently; they touch disjoint files. Both chains are waited on
+# before a failure stops the script, so the EXIT trap never removes the
+# work directory under a chain that is still running.
+pids=()
+if [ ${#files21[@]} -gt 0 ]; then
+  (
+    echo "Merging USRBIN output files..."
+    printf '%s\n' "${files21[@]}" '' edep_xz.bnn | $FLUPRO/bin/usbsuw
+    echo -e 'edep_xz.bnn\nedep_xz.dat\n' | $FLUPRO/bin/usbrea
+  ) & pids+=($!)
+fi
+if [ ${#files23[@]} -gt 0 ]; then
+  (
+    echo "Processing USRBDX output (unit 23)..."
+    printf '%s\n' "${files23[@]}" '' neut_exit.bnn | $FLUPRO/bin/usxsuw
+    echo -e 'neut_exit.bnn\nneut_exit.dat\n' | $FLUPRO/bin/usxrea
+  ) & pids+=($!)
+fi
+failed=0
+for pid in "${pids[@]}"; do
+  wait $pid || failed=1
+done
+if [ $failed -ne 0 ]; then
+  echo "=== Merging or converting output failed ==="
+  exit 1
+fi
+echo "Converted to ASCII format"
+# Copy outputs to host
+mkdir -p $OUTPUT_DIR
+cp -f *.bnn $OUTPUT_DIR/ 2>/dev/null || true
+cp -f *.dat $OUTPUT_DIR/ 2>/dev/null || true
+cp -f *.out $OUTPUT_DIR/ 2>/dev/null || true
+cp -f *.log $OUTPUT_DIR/ 2>/dev/null || true
+cp -f *.err $OUTPUT_DIR/ 2>/dev/null || true
+echo ""
+echo "Output files copied to $OUTPUT_DIR/"
+ls -la $OUTPUT_DIR/
+'''
+
 
 def run_fluka_native(
     config: SimulationConfig,
     neutron_library: str,
     template_path: str,
     output_dir: str,
+    options: Optional[DockerOptions] = None,
 ) -> RunResult:
     """
     Run FLUKA simulation with native geometry in Docker.
 
-    Mirrors run_fluka.sh exactly: mounts the project directory to /data,
-    copies neutron_bpe.inp from /data, patches with sed inside the
-    container, then runs rfluka.
-
     Args:
         config: Simulation configuration
         neutron_library: Neutron library name (JEFF, ENDF, etc.)
         template_path: Path to the FLUKA template .inp file (neutron_bpe.inp)
         output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
 
     Returns:
         RunResult with status and timing
     """
-    start_time = time.time()
+    return execute_job(
+        prepare_fluka_native(config, neutron_library, template_path, output_dir, options)
+    )
+
+
+def prepare_fluka_native(
+    config: SimulationConfig,
+    neutron_library: str,
+    template_path: str,
+    output_dir: str,
+    options: Optional[DockerOptions] = None,
+    make_dirs: bool = True,
+) -> DockerJob:
+    """
+    Build the docker command for a native-geometry FLUKA run.
+
+    Mirrors run_fluka.sh: mounts the project directory to /data, writes the
+    patched neutron_bpe.inp and the run script (run.sh) into the run's
+    output directory (the sed edits of run_fluka.sh, done on the host);
+    the script copies the input into the container's work directory,
+    then runs rfluka.
+
+    Args:
+        config: Simulation configuration
+        neutron_library: Neutron library name (JEFF, ENDF, etc.)
+        template_path: Path to the FLUKA template .inp file (neutron_bpe.inp)
+        output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
+        make_dirs: Create output_dir (False when the caller already has)
+
+    Returns:
+        DockerJob ready for execute_job() / execute_job_async()
+    """
+    options = options or DockerOptions()
 
     # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    if make_dirs:
+        os.makedirs(output_dir, exist_ok=True)
 
     abs_output = os.path.abspath(output_dir)
     abs_template = os.path.abspath(template_path)
     template_dir = os.path.dirname(abs_template)
     template_basename = os.path.basename(abs_template)   # e.g. neutron_bpe.inp
-    input_stem = template_basename.replace('.inp', '')    # e.g. neutron_bpe
 
     cycles = config.fluka.cycles
+    cpus = max(1, min(config.fluka.cpus, cycles))
     energy_gev = config.particle.energy_gev
 
     # Compute output subdirectory path relative to project root
-    # We mount the project directory (template_dir) to /data, matching run_fluka.sh
+    # We mount the project directory (template_dir) to /data, matching run_fluka.sh;
+    # a persistent container has the outputs mounted on their own
     rel_output = os.path.relpath(abs_output, template_dir)
+    out_dir = options.mount_path(FLUKA_IMAGE, abs_output, f"/data/{rel_output}")
+
+    # Patch the template on the host (what run_fluka.sh does with sed) into
+    # the run's output directory, which the container sees under /data
+    with open(os.path.join(output_dir, template_basename), 'w') as f:
+        f.write(render_native_input(abs_template, energy_gev, config.particle.fluka_name))
 
-    # Mirror run_fluka.sh exactly:
+    # Mirror run_fluka.sh:
     #  - Mount project directory to /data (single volume, like run_fluka.sh)
-    #  - Copy input from /data to /fluka_work
+    #  - Copy the patched input from $OUTPUT_DIR to /fluka_work
     #  - Use set -e for strict error handling (like run_fluka.sh)
-    #  - Patch with sed using same printf formats
     #  - Run rfluka with error handling
-    #  - Copy outputs to /data/$OUTPUT_DIR
-    inner_script = "\n".join([
-        "set -e",
-        # Install gfortran + wget exactly like run_fluka.sh
-        "if ! command -v gfortran &> /dev/null || ! command -v wget &> /dev/null; then",
-        "  echo 'Installing required packages...'",
-        "  apt-get update -qq && apt-get install -y -qq gfortran wget",
-        "fi",
-        # Variable setup matching run_fluka.sh style
-        "FLUPRO=/usr/local/fluka",
-        "export FLUPRO",
-        "export FLUFOR=gfortran",
-        f'INPUT_FILE="{template_basename}"',
-        'INPUT_BASE="${INPUT_FILE%.inp}"',
-        f'CYCLES={cycles}',
-        f'ENERGY_GEV={energy_gev}',
-        f'OUTPUT_DIR="{rel_output}"',
-        "mkdir -p /fluka_work",
-        "cd /fluka_work",
-        # Copy template from /data (same as run_fluka.sh)
-        "cp /data/$INPUT_FILE .",
-        # Patch BEAM: compute energy string with bash printf, same as run_fluka.sh
-        'ENERGY_STR=$(printf "%10.4E" $ENERGY_GEV)',
-        'sed -i "s/^BEAM .*/BEAM      $ENERGY_STR       0.0       0.0       0.0       0.0       1.0NEUTRON/" $INPUT_FILE',
-        'echo "Set neutron energy to $ENERGY_GEV GeV"',
-        # Remove any LOW-PWXS cards (pointwise libraries not installed in container)
-        'sed -i "/^LOW-PWXS/d" $INPUT_FILE',
-        'echo "FLUKA path: $FLUPRO"',
-        'echo "Running simulation with rfluka..."',
-        # Run rfluka with error handling (same pattern as run_fluka.sh)
-        f"$FLUPRO/bin/rfluka -N0 -M${{CYCLES}} ${{INPUT_BASE}} || {{",
-        '  echo ""',
-        '  echo "=== FLUKA run failed. Checking logs ==="',
-        '  echo "--- .out file ---"',
-        '  cat ${INPUT_BASE}001.out 2>/dev/null | tail -100 || echo "No .out file"',
-        '  echo "--- .err file ---"',
-        '  cat ${INPUT_BASE}001.err 2>/dev/null || echo "No .err file"',
-        '  echo "--- .log file ---"',
-        '  cat ${INPUT_BASE}001.log 2>/dev/null || echo "No .log file"',
-        "  mkdir -p /data/$OUTPUT_DIR",
-        "  cp -f *.out /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "  cp -f *.err /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "  cp -f *.log /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "  exit 1",
-        "}",
-        'echo ""',
-        'echo "Simulation complete. Processing output..."',
-        # Merge USRBIN (unit 21)
-        f"if ls {input_stem}001_fort.21 1>/dev/null 2>&1; then",
-        '  echo "Merging USRBIN output files..."',
-        f"  echo '{input_stem}001_fort.21' > usrbin21.lst",
-        f"  for i in $(seq -f '%03g' 2 $CYCLES); do",
-        f"    [ -f '{input_stem}'${{i}}_fort.21 ] && echo '{input_stem}'${{i}}_fort.21 >> usrbin21.lst",
-        "  done",
-        "  echo '' >> usrbin21.lst",
-        "  echo 'usrbin21.lst_sum' >> usrbin21.lst",
-        "  $FLUPRO/bin/usbsuw < usrbin21.lst",
-        "  [ -f usrbin21.lst_sum ] && mv usrbin21.lst_sum edep_xz.bnn",
-        "fi",
-        # Merge USRBDX (unit 23)
-        f"if ls {input_stem}001_fort.23 1>/dev/null 2>&1; then",
-        '  echo "Processing USRBDX output (unit 23)..."',
-        f"  echo '{input_stem}001_fort.23' > usrbdx23.lst",
-        f"  for i in $(seq -f '%03g' 2 $CYCLES); do",
-        f"    [ -f '{input_stem}'${{i}}_fort.23 ] && echo '{input_stem}'${{i}}_fort.23 >> usrbdx23.lst",
-        "  done",
-        "  echo '' >> usrbdx23.lst",
-        "  echo 'neut_exit.bnn' >> usrbdx23.lst",
-        "  $FLUPRO/bin/usxsuw < usrbdx23.lst",
-        "fi",
-        # Convert to ASCII
-        'echo "Converting to ASCII format..."',
-        "if [ -f edep_xz.bnn ]; then",
-        "  echo -e 'edep_xz.bnn\\nedep_xz.dat\\n' | $FLUPRO/bin/usbrea",
-        "fi",
-        "if [ -f neut_exit.bnn ]; then",
-        "  echo -e 'neut_exit.bnn\\nneut_exit.dat\\n' | $FLUPRO/bin/usxrea",
-        "fi",
-        # Copy outputs to host
-        "mkdir -p /data/$OUTPUT_DIR",
-        "cp -f *.bnn /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "cp -f *.dat /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "cp -f *.out /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "cp -f *.log /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        "cp -f *.err /data/$OUTPUT_DIR/ 2>/dev/null || true",
-        'echo ""',
-        'echo "Output files copied to /data/$OUTPUT_DIR/"',
-        "ls -la /data/$OUTPUT_DIR/",
-    ])
-
+    #  - Copy outputs to $OUTPUT_DIR
+    inner_script = FLUKA_NATIVE_HEADER % {
+        'input_file': template_basename,
+        'cycles': cycles,
+        'cpus': cpus,
+        'energy_gev': energy_gev,
+        'output_dir': out_dir,
+    } + FLUKA_NATIVE_BODY
+    # Saved next to the input rather than passed as argv, so the run can be
+    # inspected or repeated by hand; the container reads it through /data
+    with open(os.path.join(output_dir, NATIVE_SCRIPT), 'w') as f:
+        f.write(inner_script)
+
+    # /fluka_work only holds per-cycle fort.* files and merge intermediates;
+    # everything worth keeping is copied to /data, so it can live in tmpfs.
+    # The run times itself out inside the container, which also covers
+    # docker exec, where killing the client would leave the run going.
     cmd = [
-        "docker", "run", "--rm",
-        "-v", f"{template_dir}:/data",
-        "-w", "/fluka_work",
-        FLUKA_IMAGE,
-        "bash", "-c", inner_script,
+        *options.command(FLUKA_IMAGE, [(template_dir, "/data", False)],
+                         workdir="/fluka_work", scratch="/fluka_work",
+                         cpus=cpus if cpus > 1 else None),
+        "timeout", f"--kill-after={STOP_TIMEOUT}", str(config.fluka.timeout),
+        "bash", f"{out_dir}/{NATIVE_SCRIPT}",
     ]
 
-    returncode, stdout, stderr = run_command(cmd)
-
-    # Write run log regardless of outcome
-    with open(os.path.join(output_dir, "run.log"), 'w') as f:
-        f.write(f"=== STDOUT ===\n{stdout}\n\n=== STDERR ===\n{stderr}\n")
-
-    runtime = time.time() - start_time
-
-    return RunResult(
+    return DockerJob(
         code='fluka',
         model=neutron_library,
-        success=(returncode == 0),
         output_dir=output_dir,
-        runtime_seconds=runtime,
-        error_message=stderr if returncode != 0 else None,
+        cmd=cmd,
+        timeout=config.fluka.timeout + TIMEOUT_GRACE,
+        log_file=os.path.join(output_dir, "run.log"),
+        err_file=os.path.join(output_dir, "run.err"),
     )
 
 
+# Script run by FLUGG containers ($1 = input file, $2 = cycles): the run,
+# then, in the same container, the merge of this run's per-cycle USRBIN
+# files (cycles 1..$2 of the input's stem, so files left in the output
+# directory by an earlier run are not mixed in) by usbsuw and their
+# conversion to ASCII. The merge output goes to run.log with the run's;
+# a failed merge is noted in run.err but leaves the run successful.
+FLUGG_SCRIPT = r'''flugg_run.sh "$1" "$2" || exit
+files=()
+for i in $(seq 1 "$2"); do
+  f=$(printf '%s%03d_fort.21' "${1%.inp}" "$i")
+  [ -f "$f" ] && files+=("$f")
+done
+if [ ${#files[@]} -gt 0 ]; then
+  { printf '%s\n' "${files[@]}" '' edep_xz.bnn | $FLUPRO/bin/usbsuw &&
+    echo -e 'edep_xz.bnn\nedep_xz.dat\n' | $FLUPRO/bin/usbrea; } || echo "USRBIN merge failed" >&2
+fi
+'''
+
+
 def run_fluka_flugg(
     config: SimulationConfig,
     neutron_library: str,
     input_file: str,
     output_dir: str,
+    options: Optional[DockerOptions] = None,
 ) -> RunResult:
     """
     Run FLUKA simulation with FLUGG (external GDML geometry).
@@ -230,60 +735,74 @@ def run_fluka_flugg(
         neutron_library: Neutron library name
         input_file: Path to FLUKA input file
         output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
 
     Returns:
         RunResult with status and timing
     """
-    start_time = time.time()
+    return execute_job(
+        prepare_fluka_flugg(config, neutron_library, input_file, output_dir, options)
+    )
+
+
+def prepare_fluka_flugg(
+    config: SimulationConfig,
+    neutron_library: str,
+    input_file: str,
+    output_dir: str,
+    options: Optional[DockerOptions] = None,
+    make_dirs: bool = True,
+    gdml_path: Optional[str] = None,
+) -> DockerJob:
+    """
+    Build the docker command for a FLUGG run and its USRBIN merge.
+
+    Args:
+        config: Simulation configuration
+        neutron_library: Neutron library name
+        input_file: Path to FLUKA input file
+        output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
+        make_dirs: Create output_dir (False when the caller already has)
+        gdml_path: Absolute GDML path (default: from config.geometry_gdml)
+
+    Returns:
+        DockerJob ready for execute_job() / execute_job_async()
+    """
+    options = options or DockerOptions()
 
     # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    if make_dirs:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Copy input file to output directory if not already there
+    # Stage input file in the output directory if not already there
     input_basename = os.path.basename(input_file)
     dest = os.path.join(output_dir, input_basename)
-    if os.path.abspath(input_file) != os.path.abspath(dest):
-        shutil.copy(input_file, dest)
+    _stage_input(input_file, dest)
 
     # Get absolute path to GDML file
-    gdml_path = os.path.abspath(config.geometry_gdml)
+    gdml_path = gdml_path or os.path.abspath(config.geometry_gdml)
+
+    abs_output = os.path.abspath(output_dir)
+    mounts = [(abs_output, "/data", False), (gdml_path, "/geometry.gdml", True)]
+    data_dir = options.mount_path(FLUGG_IMAGE, abs_output, "/data")
+    gdml_file = options.mount_path(FLUGG_IMAGE, gdml_path, "/geometry.gdml")
 
-    # Docker command for FLUGG
+    # Run and merge in one container
     cmd = [
-        "docker", "run", "--rm",
-        "-v", f"{os.path.abspath(output_dir)}:/data",
-        "-v", f"{gdml_path}:/geometry.gdml:ro",
-        "-e", "FLUGG_GDML=/geometry.gdml",
-        "-w", "/data",
-        FLUGG_IMAGE,
-        "flugg_run.sh", input_basename, str(config.fluka.cycles),
+        *options.command(FLUGG_IMAGE, mounts, workdir=data_dir,
+                         env={"FLUGG_GDML": gdml_file}),
+        "bash", "-c", FLUGG_SCRIPT, "flugg_run.sh",
+        input_basename, str(config.fluka.cycles),
     ]
 
-    returncode, stdout, stderr = run_command(cmd)
-
-    # Process output files
-    if returncode == 0:
-        merge_cmd = [
-            "docker", "run", "--rm",
-            "-v", f"{os.path.abspath(output_dir)}:/data",
-            "-w", "/data",
-            FLUGG_IMAGE,
-            "bash", "-c",
-            "for f in *_fort.21; do "
-            "$FLUPRO/bin/usbsuw <<< \"${f%_fort.21}\" && "
-            "$FLUPRO/bin/usbrea <<< \"${f%.21}.bnn\"; done 2>/dev/null || true"
-        ]
-        run_command(merge_cmd)
-
-    runtime = time.time() - start_time
-
-    return RunResult(
+    return DockerJob(
         code='fluka',
         model=neutron_library,
-        success=(returncode == 0),
         output_dir=output_dir,
-        runtime_seconds=runtime,
-        error_message=stderr if returncode != 0 else None,
+        cmd=cmd,
+        log_file=os.path.join(output_dir, "run.log"),
+        err_file=os.path.join(output_dir, "run.err"),
     )
 
 
@@ -292,6 +811,7 @@ def run_geant4(
     physics_list: str,
     macro_file: str,
     output_dir: str,
+    options: Optional[DockerOptions] = None,
 ) -> RunResult:
     """
     Run Geant4 simulation in Docker.
@@ -301,63 +821,255 @@ def run_geant4(
         physics_list: Physics list name
         macro_file: Path to Geant4 macro file
         output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
 
     Returns:
         RunResult with status and timing
     """
-    start_time = time.time()
+    return execute_job(
+        prepare_geant4(config, physics_list, macro_file, output_dir, options)
+    )
+
+
+def prepare_geant4(
+    config: SimulationConfig,
+    physics_list: str,
+    macro_file: str,
+    output_dir: str,
+    options: Optional[DockerOptions] = None,
+    make_dirs: bool = True,
+    gdml_path: Optional[str] = None,
+) -> DockerJob:
+    """
+    Build the docker command for a Geant4 run.
+
+    Args:
+        config: Simulation configuration
+        physics_list: Physics list name
+        macro_file: Path to Geant4 macro file
+        output_dir: Output directory for results
+        options: Docker settings (default: DockerOptions())
+        make_dirs: Create output_dir (False when the caller already has)
+        gdml_path: Absolute GDML path (default: from config.geometry_gdml)
+
+    Returns:
+        DockerJob ready for execute_job() / execute_job_async()
+    """
+    options = options or DockerOptions()
 
     # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    if make_dirs:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Copy macro file to output directory if not already there
+    # Stage macro file in the output directory if not already there
     macro_basename = os.path.basename(macro_file)
     dest = os.path.join(output_dir, macro_basename)
-    if os.path.abspath(macro_file) != os.path.abspath(dest):
-        shutil.copy(macro_file, dest)
+    _stage_input(macro_file, dest)
 
     # Get absolute path to GDML file
-    gdml_path = os.path.abspath(config.geometry_gdml)
+    gdml_path = gdml_path or os.path.abspath(config.geometry_gdml)
 
     # Docker command for Geant4
+    abs_output = os.path.abspath(output_dir)
+    data_dir = options.mount_path(GEANT4_IMAGE, abs_output, "/data")
+    gdml_file = options.mount_path(GEANT4_IMAGE, gdml_path, "/geometry.gdml")
     cmd = [
-        "docker", "run", "--rm",
-        "-v", f"{os.path.abspath(output_dir)}:/data",
-        "-v", f"{gdml_path}:/geometry.gdml:ro",
-        "-w", "/data",
-        GEANT4_IMAGE,
+        *options.command(GEANT4_IMAGE,
+                         [(abs_output, "/data", False), (gdml_path, "/geometry.gdml", True)],
+                         workdir=data_dir),
         "comparison_app",
-        "-g", "/geometry.gdml",
+        "-g", gdml_file,
         "-p", physics_list,
         "-m", macro_basename,
-        "-o", "/data",
+        "-o", data_dir,
     ]
 
-    returncode, stdout, stderr = run_command(cmd)
+    return DockerJob(
+        code='geant4',
+        model=physics_list,
+        output_dir=output_dir,
+        cmd=cmd,
+        log_file=os.path.join(output_dir, "run.log"),
+        err_file=os.path.join(output_dir, "run.err"),
+    )
 
-    runtime = time.time() - start_time
 
-    # Write log
-    with open(os.path.join(output_dir, "run.log"), 'w') as f:
-        f.write(f"=== STDOUT ===\n{stdout}\n\n=== STDERR ===\n{stderr}\n")
+def run_geant4_batch(
+    config: SimulationConfig,
+    physics_lists: List[str],
+    macro_files: Dict[str, str],
+    output_root: str,
+    options: Optional[DockerOptions] = None,
+    make_dirs: bool = True,
+    gdml_path: Optional[str] = None,
+    echo: bool = False,
+) -> List[RunResult]:
+    """
+    Run several Geant4 physics lists one after another in a single container.
 
-    return RunResult(
+    Args:
+        config: Simulation configuration
+        physics_lists: Physics list names
+        macro_files: Macro file of each physics list
+        output_root: Directory holding one <physics list> output dir per run
+        options: Docker settings (default: DockerOptions())
+        make_dirs: Create the output dirs (False when the caller already has)
+        gdml_path: Absolute GDML path (default: from config.geometry_gdml)
+        echo: Show the batch's progress lines on the terminal as well
+
+    Returns:
+        One RunResult per physics list, in physics_lists order
+    """
+    job = prepare_geant4_batch(config, physics_lists, macro_files, output_root,
+                               options, make_dirs, gdml_path)
+    returncode, _, stderr = run_command(job.cmd, timeout=job.timeout,
+                                        stdout_path=job.log_file,
+                                        stderr_path=job.err_file,
+                                        container=job.container,
+                                        echo=echo)
+    return collect_geant4_batch(physics_lists, output_root, stderr if returncode != 0 else None)
+
+
+def prepare_geant4_batch(
+    config: SimulationConfig,
+    physics_lists: List[str],
+    macro_files: Dict[str, str],
+    output_root: str,
+    options: Optional[DockerOptions] = None,
+    make_dirs: bool = True,
+    gdml_path: Optional[str] = None,
+) -> DockerJob:
+    """
+    Build the docker command running several physics lists in one container.
+
+    The container pays its start-up once and loops over the lists; each
+    iteration streams its output to <list>/run.log and run.err and
+    records its exit status and timing in <list>/run.status for
+    collect_geant4_batch().
+
+    Args:
+        config: Simulation configuration
+        physics_lists: Physics list names
+        macro_files: Macro file of each physics list
+        output_root: Directory holding one <physics list> output dir per run
+        options: Docker settings (default: DockerOptions())
+        make_dirs: Create the output dirs (False when the caller already has)
+        gdml_path: Absolute GDML path (default: from config.geometry_gdml)
+
+    Returns:
+        DockerJob ready for execute_job() / execute_job_async()
+    """
+    options = options or DockerOptions()
+
+    for phys in physics_lists:
+        output_dir = os.path.join(output_root, phys)
+        if make_dirs:
+            os.makedirs(output_dir, exist_ok=True)
+        macro_file = macro_files[phys]
+        _stage_input(macro_file, os.path.join(output_dir, os.path.basename(macro_file)))
+        status_file = os.path.join(output_dir, "run.status")
+        if os.path.exists(status_file):
+            os.remove(status_file)
+
+    gdml_path = gdml_path or os.path.abspath(config.geometry_gdml)
+    abs_root = os.path.abspath(output_root)
+    data_dir = options.mount_path(GEANT4_IMAGE, abs_root, "/data")
+    gdml_file = options.mount_path(GEANT4_IMAGE, gdml_path, "/geometry.gdml")
+
+    script = "\n".join([
+        "run_list() {",
+        f'  cd "{data_dir}/$1"',
+        "  local start=$(date +%s.%N)",
+        f'  comparison_app -g "{gdml_file}" -p "$1" -m "$2" -o "{data_dir}/$1" > run.log 2> run.err',
+        '  echo "$? $start $(date +%s.%N)" > run.status',
+        '  echo "$1: exit $(cut -d" " -f1 run.status)"',
+        "}",
+        *(f"run_list {shlex.quote(phys)} {shlex.quote(os.path.basename(macro_files[phys]))}"
+          for phys in physics_lists),
+    ])
+
+    cmd = [
+        *options.command(GEANT4_IMAGE,
+                         [(abs_root, "/data", False), (gdml_path, "/geometry.gdml", True)],
+                         workdir=data_dir),
+        "bash", "-c", script,
+    ]
+
+    return DockerJob(
         code='geant4',
-        model=physics_list,
-        success=(returncode == 0),
-        output_dir=output_dir,
-        runtime_seconds=runtime,
-        error_message=stderr if returncode != 0 else None,
+        model=",".join(physics_lists),
+        output_dir=output_root,
+        cmd=cmd,
+        timeout=3600 * len(physics_lists),
+        log_file=os.path.join(output_root, "batch.log"),
+        err_file=os.path.join(output_root, "batch.err"),
     )
 
 
+def collect_geant4_batch(physics_lists: List[str], output_root: str,
+                         batch_error: Optional[str] = None) -> List[RunResult]:
+    """
+    RunResults of a finished Geant4 batch, from each list's run.status.
+
+    A list without a status file did not run (the container failed or
+    timed out first) and is reported with batch_error.
+    """
+    results = []
+    for phys in physics_lists:
+        output_dir = os.path.join(output_root, phys)
+        try:
+            with open(os.path.join(output_dir, "run.status")) as f:
+                rc, start, end = f.read().split()
+            returncode, runtime = int(rc), float(end) - float(start)
+        except (OSError, ValueError):
+            returncode, runtime = -1, 0.0
+        error = None
+        if returncode != 0:
+            error = (_read_tail(os.path.join(output_dir, "run.err"))
+                     or batch_error or "Not run: Geant4 batch container failed")
+        results.append(RunResult(
+            code='geant4',
+            model=phys,
+            success=(returncode == 0),
+            output_dir=output_dir,
+            runtime_seconds=runtime,
+            error_message=error,
+        ))
+    return results
+
+
 class ComparisonRunner:
     """
     Orchestrates running multiple FLUKA and Geant4 simulations.
     """
 
+    # Image each task type runs in
+    TASK_IMAGES = {'fluka_native': FLUKA_IMAGE, 'fluka_flugg': FLUGG_IMAGE, 'geant4': GEANT4_IMAGE}
+
+    # Files a successful run of each task type leaves in its output
+    # directory; a cached run is only skipped while they all exist
+    RESULT_FILES = {
+        'fluka_native': ('edep_xz.bnn', 'edep_xz.dat'),
+        'fluka_flugg': ('edep_xz.bnn', 'edep_xz.dat'),
+        'geant4': ('edep_profile.dat', 'neutron_spectrum.dat'),
+    }
+
+    # Relative runtime of a model (default 1). The high-precision neutron
+    # physics lists are several times slower than the others; parallel
+    # runs start the most expensive tasks first so none is left to run
+    # alone at the end.
+    ESTIMATED_COST = {
+        'QGSP_BERT_HP': 10,
+        'FTFP_BERT_HP': 8,
+        'QGSP_BIC_HP': 7,
+        'Shielding': 7,
+    }
+
     def __init__(self, config: SimulationConfig, use_flugg: bool = False,
-                 template_path: str = DEFAULT_FLUKA_TEMPLATE):
+                 template_path: str = DEFAULT_FLUKA_TEMPLATE,
+                 consistency: Optional[str] = None, persistent: bool = False,
+                 isolate_network: bool = True, pin_resources: bool = False,
+                 echo_output: bool = False):
         """
         Initialize the runner.
 
@@ -365,11 +1077,35 @@ class ComparisonRunner:
             config: Simulation configuration
             use_flugg: Whether to use FLUGG for FLUKA runs
             template_path: Path to the FLUKA template .inp file
+            consistency: Bind-mount consistency for output volumes
+                ('delegated', 'cached', 'consistent' or ''; None = host default)
+            persistent: Start long-lived containers for run_all() (one per
+                image and parallel worker) and docker-exec each run into
+                one instead of docker run
+            isolate_network: Run containers that need no network with
+                --network=none
+            pin_resources: Give each parallel worker its own CPU cores and
+                memory share (--cpus, --cpuset-cpus, --memory)
+            echo_output: Show each sequential run's output on the terminal
+                as it is written to run.log
         """
         self.config = config
         self.use_flugg = use_flugg
         self.template_path = template_path
+        self.docker_options = DockerOptions(isolate_network=isolate_network,
+                                            scratch_size=config.fluka.scratch_size)
+        if consistency is not None:
+            self.docker_options.consistency = consistency
+        self.persistent = persistent
+        self.pin_resources = pin_resources
+        self.echo_output = echo_output
         self.results: List[RunResult] = []
+        # Names of the persistent containers currently running
+        self._containers: List[str] = []
+        # Resolved once; every task's paths derive from these
+        self._gdml_abs = os.path.abspath(config.geometry_gdml)
+        self._template_abs = os.path.abspath(template_path)
+        self._base_output_abs = os.path.abspath(config.output_dir)
 
     def run_all(
         self,
@@ -377,19 +1113,27 @@ class ComparisonRunner:
         geant4_models: Optional[List[str]] = None,
         parallel: bool = False,
         max_workers: int = 4,
+        force: bool = False,
     ) -> List[RunResult]:
         """
         Run all configured simulations.
 
+        A run whose output directory holds the cache key of its current
+        inputs (written when it last succeeded) and all its RESULT_FILES
+        is not repeated.
+
         Args:
             fluka_models: List of FLUKA models to run (None = all from config)
             geant4_models: List of Geant4 models to run (None = all from config)
             parallel: Whether to run simulations in parallel
-            max_workers: Maximum parallel workers
+            max_workers: Maximum parallel workers, further capped by
+                effective_workers() to what the host's cores and memory allow
+            force: Repeat every run, even those with unchanged inputs
 
         Returns:
             List of RunResult objects
         """
+        from .fluka_generator import generate_fluka_input
         from .geant4_generator import generate_geant4_macro
 
         # Determine models to run
@@ -398,124 +1142,381 @@ class ComparisonRunner:
         if geant4_models is None:
             geant4_models = self.config.geant4.physics_lists if self.config.geant4.enabled else []
 
-        base_output = self.config.output_dir
+        base_output = self._base_output_abs
         tasks = []
+        gen_jobs = []   # (generator, args) writing each run's input file
 
         # Prepare FLUKA tasks
-        # For native mode: pass template_path; sed patching done inside container.
+        # For native mode: pass template_path; prepare_fluka_native() patches
+        # it on the host (render_native_input) into the run's directory.
         # For FLUGG mode: pre-generate patched input file.
         for lib in fluka_models:
             output_dir = os.path.join(base_output, 'fluka', lib)
-            os.makedirs(output_dir, exist_ok=True)
 
             if self.use_flugg:
-                from .fluka_generator import generate_fluka_input
                 input_file = os.path.join(output_dir, 'input.inp')
-                generate_fluka_input(self.config, lib, input_file, self.template_path)
+                gen_jobs.append((generate_fluka_input,
+                                 (self.config, lib, input_file, self._template_abs)))
                 tasks.append(('fluka_flugg', lib, input_file, output_dir))
             else:
-                # Pass template_path as third element; no pre-generation needed
-                tasks.append(('fluka_native', lib, self.template_path, output_dir))
+                # Pass template_path as third element; patched when the job is prepared
+                tasks.append(('fluka_native', lib, self._template_abs, output_dir))
 
         # Prepare Geant4 tasks
         for phys in geant4_models:
             output_dir = os.path.join(base_output, 'geant4', phys)
             macro_file = os.path.join(output_dir, 'run.mac')
-            generate_geant4_macro(self.config, phys, macro_file)
+            gen_jobs.append((generate_geant4_macro, (self.config, phys, macro_file)))
             tasks.append(('geant4', phys, macro_file, output_dir))
 
+        # Create every output directory in one pass, before generation
+        for _, _, _, output_dir in tasks:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # Write all input files up front, concurrently, before any run starts
+        self._generate_inputs(gen_jobs)
+        # Image IDs are part of the cache keys
+        self._ensure_images(tasks)
+
+        # Skip runs whose inputs are unchanged since they last succeeded
+        # and whose results are still there; the others lose their key
+        # until they succeed again
+        keys = {task[3]: self._cache_key(task) for task in tasks}
+        results = {}
+        pending = []
+        for task in tasks:
+            task_type, model, _, output_dir = task
+            key_file = os.path.join(output_dir, CACHE_KEY_FILE)
+            if (not force and _read_tail(key_file) == keys[output_dir]
+                    and all(os.path.exists(os.path.join(output_dir, name))
+                            for name in self.RESULT_FILES[task_type])):
+                print(f"{task_type}/{model}: unchanged, skipped")
+                results[output_dir] = RunResult(
+                    code=task_type.split('_')[0],
+                    model=model,
+                    success=True,
+                    output_dir=output_dir,
+                    runtime_seconds=0,
+                )
+                continue
+            if os.path.exists(key_file):
+                os.remove(key_file)
+            pending.append(task)
+
+        parallel = parallel and len(pending) > 1
+        workers = 1
+        if parallel:
+            workers = effective_workers(max_workers, len(pending))
+            if workers < min(max_workers, len(pending)):
+                print(f"Limiting parallel workers to {workers} "
+                      f"(CPU cores / available memory)")
+        slots = self._slot_options(workers)
+
         # Execute tasks
-        if parallel and len(tasks) > 1:
-            self.results = self._run_parallel(tasks, max_workers)
-        else:
-            self.results = self._run_sequential(tasks)
+        try:
+            if self.persistent and pending:
+                self._start_containers(pending, slots)
+            if parallel:
+                ran = self._run_parallel(pending, slots)
+            else:
+                ran = self._run_sequential(pending)
+        finally:
+            self._stop_containers(slots)
+
+        for result in ran:
+            if result.success:
+                with open(os.path.join(result.output_dir, CACHE_KEY_FILE), 'w') as f:
+                    f.write(keys[result.output_dir])
+            results[result.output_dir] = result
 
+        self.results = [results[task[3]] for task in tasks]
         return self.results
 
+    def _cache_key(self, task: tuple) -> str:
+        """
+        Hash of everything a task's results depend on.
+
+        Covers the file the run reads (FLUKA template, FLUGG input or
+        Geant4 macro), the GDML geometry's mtime and size for runs that
+        load it, the run settings and the image ID.
+        """
+        task_type, model, input_path, _ = task
+        config = self.config
+        image = self.TASK_IMAGES[task_type]
+        settings = {
+            'task': task_type,
+            'model': model,
+            'energy_gev': config.particle.energy_gev,
+            'particle': config.particle.fluka_name,
+            'events': config.events,
+            'seed': config.seed,
+            'cycles': config.fluka.cycles,
+            'cpus': config.fluka.cpus,
+            'image': self.docker_options.images.get(image, image),
+        }
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        with open(input_path, 'rb') as f:
+            digest.update(f.read())
+        if task_type != 'fluka_native':
+            st = os.stat(self._gdml_abs)
+            digest.update(f"{st.st_mtime_ns}:{st.st_size}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _generate_inputs(gen_jobs: List[tuple]) -> None:
+        """
+        Run (generator, args) input-file jobs.
+
+        The generators are independent and mostly file I/O, so they run
+        on a small thread pool; the first error is re-raised.
+        """
+        if len(gen_jobs) <= 1:
+            for generator, args in gen_jobs:
+                generator(*args)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(8, len(gen_jobs))) as executor:
+            list(executor.map(lambda job: job[0](*job[1]), gen_jobs))
+
+    def _ensure_images(self, tasks: List[tuple]) -> None:
+        """
+        Resolve the image of every task type in tasks to its image ID.
+
+        Each image is inspected once (and pulled once if missing) before
+        any run starts, rather than looked up by every docker run, and the
+        sweep is pinned to the IDs found. An image that cannot be found is
+        left as its tag, so its runs fail as they would without this.
+        """
+        images = self.docker_options.images
+        for image in sorted({self.TASK_IMAGES[task[0]] for task in tasks}):
+            if image in images:
+                continue
+            inspect = ["docker", "image", "inspect", "--format", "{{.Id}}", image]
+            returncode, stdout, _ = run_command(inspect, timeout=60)
+            if returncode != 0:
+                print(f"Image {image} not found locally, pulling...")
+                run_command(["docker", "pull", image], timeout=1800)
+                returncode, stdout, _ = run_command(inspect, timeout=60)
+            if returncode != 0 or not stdout.strip():
+                print(f"WARNING: image {image} unavailable; build it first (see docker/)")
+                continue
+            images[image] = stdout.strip()
+
+    def _slot_options(self, n: int) -> List[DockerOptions]:
+        """
+        Docker options of each of n concurrent run slots.
+
+        A single slot uses the runner's own options. Otherwise every slot
+        gets its own copy (with its own cores and memory share under
+        pin_resources) so it can hold its own persistent containers.
+        """
+        if n <= 1:
+            return [self.docker_options]
+        if self.pin_resources:
+            slots = self.docker_options.slots(n)
+        else:
+            slots = [replace(self.docker_options) for _ in range(n)]
+        for slot in slots:
+            slot.containers = {}
+        return slots
+
+    def _start_containers(self, tasks: List[tuple], slots: List[DockerOptions]) -> None:
+        """
+        Start the detached containers the slots' runs docker-exec into.
+
+        Each slot gets one container per image its runs may need, up to
+        the number of tasks using that image, so concurrent runs never
+        share a container and container start-up is paid once per slot
+        rather than once per run. Like fresh containers, they mount the
+        template directory and outputs read-write and the geometry
+        read-only, each under HOST_MOUNT, take the slot's resource limits,
+        and idle until exec'd into. A run on a slot without a container for
+        its image falls back to docker run.
+        """
+        counts: Dict[str, int] = {}
+        for task in tasks:
+            image = self.TASK_IMAGES[task[0]]
+            counts[image] = counts.get(image, 0) + 1
+
+        mounts = [
+            (os.path.dirname(self._template_abs), f"{HOST_MOUNT}/template", False),
+            (self._base_output_abs, f"{HOST_MOUNT}/output", False),
+            (self._gdml_abs, f"{HOST_MOUNT}/geometry.gdml", True),
+        ]
+
+        for i, options in enumerate(slots):
+            options.mounts = mounts
+            for image in sorted(counts):
+                if i >= counts[image]:
+                    continue
+                name = (f"fluka-study-{image.replace(':', '-').replace('/', '-')}"
+                        f"-{os.getpid()}-{i}")
+                cmd = [
+                    "docker", "run", "-d", "--rm", "--name", name,
+                    *options.network(),
+                    *options.limits(),
+                    *(options.scratch("/fluka_work") if image == FLUKA_IMAGE else []),
+                    *[arg for host_path, container_path, read_only in mounts
+                      for arg in options.volume(host_path, container_path, read_only)],
+                    "--entrypoint", "sleep",
+                    options.images.get(image, image), "infinity",
+                ]
+                returncode, _, stderr = run_command(cmd, timeout=300)
+                if returncode != 0:
+                    raise RuntimeError(
+                        f"Could not start persistent {image} container: {stderr.strip()}")
+                options.containers[image] = name
+                self._containers.append(name)
+                print(f"Started persistent container {name}")
+
+    def _stop_containers(self, slots: List[DockerOptions]) -> None:
+        """Remove the persistent containers started by _start_containers()."""
+        if self._containers:
+            run_command(["docker", "rm", "-f", *self._containers], timeout=120)
+            self._containers.clear()
+        for options in slots:
+            options.containers.clear()
+
     def _run_sequential(self, tasks: List[tuple]) -> List[RunResult]:
-        """Run tasks sequentially."""
+        """
+        Run tasks sequentially.
+
+        With more than one Geant4 task, all of them run as one batch in a
+        single container (after the FLUKA tasks) rather than one each.
+        """
+        geant4_tasks = [task for task in tasks if task[0] == 'geant4']
+        batch = len(geant4_tasks) > 1
         results = []
-        for task_type, model, input_or_template, output_dir in tasks:
+        for task in tasks:
+            task_type, model, _, _ = task
+            if batch and task_type == 'geant4':
+                continue
             print(f"Running {task_type}/{model}...")
-            if task_type == 'fluka_native':
-                result = run_fluka_native(
-                    self.config, model, input_or_template, output_dir
-                )
-            elif task_type == 'fluka_flugg':
-                result = run_fluka_flugg(
-                    self.config, model, input_or_template, output_dir
-                )
-            else:  # geant4
-                result = run_geant4(
-                    self.config, model, input_or_template, output_dir
-                )
-            results.append(result)
-            status = "OK" if result.success else "FAILED"
-            print(f"  {status} ({result.runtime_seconds:.1f}s)")
-            if not result.success:
-                log = os.path.join(result.output_dir, "run.log")
-                if os.path.exists(log):
-                    print(f"  Log: {log}")
-                if result.error_message:
-                    print(f"  Error: {result.error_message[:200]}")
+            self._report(execute_job(self._prepare(task), echo=self.echo_output), results)
+
+        if batch:
+            physics_lists = [task[1] for task in geant4_tasks]
+            print(f"Running geant4/{','.join(physics_lists)} in one container...")
+            batch_results = run_geant4_batch(
+                self.config,
+                physics_lists,
+                {task[1]: task[2] for task in geant4_tasks},
+                os.path.dirname(geant4_tasks[0][3]),
+                self.docker_options,
+                make_dirs=False,
+                gdml_path=self._gdml_abs,
+                echo=self.echo_output,
+            )
+            for result in batch_results:
+                print(f"  geant4/{result.model}:")
+                self._report(result, results)
         return results
 
-    def _run_parallel(self, tasks: List[tuple], max_workers: int) -> List[RunResult]:
-        """Run tasks in parallel."""
-        results = []
+    @staticmethod
+    def _report(result: RunResult, results: List[RunResult]) -> None:
+        """Print the outcome of a sequential run (as one write) and collect it."""
+        results.append(result)
+        status = "OK" if result.success else "FAILED"
+        lines = [f"  {status} ({result.runtime_seconds:.1f}s)"]
+        if not result.success:
+            for name in ("run.log", "run.err"):
+                log = os.path.join(result.output_dir, name)
+                if os.path.exists(log):
+                    lines.append(f"  Log: {log}")
+            if result.error_message:
+                lines.append(f"  Error: {result.error_message.strip()[:200]}")
+        print("\n".join(lines))
 
-        def run_task(task):
-            task_type, model, input_or_template, output_dir = task
-            if task_type == 'fluka_native':
-                return run_fluka_native(
-                    self.config, model, input_or_template, output_dir
-                )
-            elif task_type == 'fluka_flugg':
-                return run_fluka_flugg(
-                    self.config, model, input_or_template, output_dir
-                )
-            else:
-                return run_geant4(
-                    self.config, model, input_or_template, output_dir
-                )
+    def _prepare(self, task: tuple, options: Optional[DockerOptions] = None) -> DockerJob:
+        """
+        Build the DockerJob for a (task_type, model, input, output_dir) task.
+
+        options defaults to the runner's docker options.
+        """
+        task_type, model, input_or_template, output_dir = task
+        options = options or self.docker_options
+        if task_type == 'fluka_native':
+            return prepare_fluka_native(
+                self.config, model, input_or_template, output_dir, options,
+                make_dirs=False,
+            )
+        elif task_type == 'fluka_flugg':
+            return prepare_fluka_flugg(
+                self.config, model, input_or_template, output_dir, options,
+                make_dirs=False, gdml_path=self._gdml_abs,
+            )
+        else:
+            return prepare_geant4(
+                self.config, model, input_or_template, output_dir, options,
+                make_dirs=False, gdml_path=self._gdml_abs,
+            )
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {
-                executor.submit(run_task, task): task for task in tasks
-            }
-
-            for future in as_completed(future_to_task):
-                task = future_to_task[future]
-                task_type, model, _, _ = task
-                try:
-                    result = future.result()
-                    results.append(result)
-                    status = "OK" if result.success else "FAILED"
-                    print(f"{task_type}/{model}: {status} ({result.runtime_seconds:.1f}s)")
-                except Exception as e:
-                    print(f"{task_type}/{model}: ERROR - {e}")
-                    results.append(RunResult(
-                        code=task_type.split('_')[0],
-                        model=model,
-                        success=False,
-                        output_dir=task[3],
-                        runtime_seconds=0,
-                        error_message=str(e),
-                    ))
+    def _run_parallel(self, tasks: List[tuple], slots: List[DockerOptions]) -> List[RunResult]:
+        """
+        Run tasks concurrently on an asyncio event loop.
 
-        return results
+        Each run is a docker client subprocess awaited on the loop, with
+        one run in flight per slot; no worker threads are involved.
+        Tasks start in ESTIMATED_COST order; results keep task order.
+        """
+        import asyncio
+        return asyncio.run(self._run_async(tasks, slots))
+
+    async def _run_async(self, tasks: List[tuple], slots: List[DockerOptions]) -> List[RunResult]:
+        """Coroutine behind _run_parallel()."""
+        import asyncio
+
+        # Each run holds a slot (its docker options, and with persistent
+        # its containers) while in flight, so at most len(slots) run at
+        # once; with pin_resources every slot has its own cores and memory
+        free = asyncio.Queue()
+        for options in slots:
+            free.put_nowait(options)
+        # Longest first; the queue hands out slots in request order
+        order = sorted(range(len(tasks)),
+                       key=lambda i: -self.ESTIMATED_COST.get(tasks[i][1], 1))
+
+        async def run_task(task):
+            task_type, model, _, output_dir = task
+            options = await free.get()
+            try:
+                result = await execute_job_async(self._prepare(task, options))
+            except Exception as e:
+                print(f"{task_type}/{model}: ERROR - {e}")
+                return RunResult(
+                    code=task_type.split('_')[0],
+                    model=model,
+                    success=False,
+                    output_dir=output_dir,
+                    runtime_seconds=0,
+                    error_message=str(e),
+                )
+            finally:
+                free.put_nowait(options)
+            status = "OK" if result.success else "FAILED"
+            print(f"{task_type}/{model}: {status} ({result.runtime_seconds:.1f}s)")
+            return result
+
+        results = await asyncio.gather(*(run_task(tasks[i]) for i in order))
+        by_index = dict(zip(order, results))
+        return [by_index[i] for i in range(len(tasks))]
 
     def generate_summary(self, output_file: Optional[str] = None) -> str:
-        """Generate a summary of all runs."""
-        lines = ["code,model,success,runtime_s,error"]
-        for r in self.results:
-            error = r.error_message.replace(',', ';')[:100] if r.error_message else ""
-            lines.append(f"{r.code},{r.model},{r.success},{r.runtime_seconds:.1f},{error}")
+        """
+        Generate a CSV summary of all runs.
 
-        summary = "\n".join(lines)
+        The CSV text is returned, and also written to output_file if given.
+        """
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["code", "model", "success", "runtime_s", "error"])
+        for r in self.results:
+            error = r.error_message[:100] if r.error_message else ""
+            writer.writerow([r.code, r.model, r.success, f"{r.runtime_seconds:.1f}", error])
+        summary = out.getvalue()
 
         if output_file:
-            with open(output_file, 'w') as f:
+            with open(output_file, 'w', newline='') as f:
                 f.write(summary)
 
         return summary